@@ -10,6 +10,7 @@ from alembic import context
 from src.config import settings
 from src.dao import BaseModel
 from src.users.models import User
+from src.tasks.models import TaskLog
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,123 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from config import settings
+from clients import clients
+
+
+def normalize_topic(text: str) -> str:
+    """Приводит тему к виду, в котором регистр, пробелы и пунктуация
+    не влияют на ключ кеша."""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+class ResultCache:
+    """Кеш результатов Supervisor.process_task.
+
+    L1 — LRU в памяти процесса с ограничением размера и TTL,
+    L2 — Redis, общий для всех реплик бота.
+    """
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        max_size: Optional[int] = None,
+        l1_ttl: Optional[int] = None,
+        ttl: Optional[int] = None,
+        namespace: str = "ttc:result",
+    ):
+        self.redis = Redis.from_url(redis_url) if redis_url else clients.redis()
+        self.max_size = max_size or settings.cache.CACHE_L1_SIZE
+        self.l1_ttl = l1_ttl or settings.cache.CACHE_L1_TTL
+        self.ttl = ttl or settings.cache.CACHE_TTL
+        self.namespace = namespace
+        self._l1: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+
+    def key(self, topic: str) -> Optional[str]:
+        normalized = normalize_topic(topic)
+        if not normalized:
+            return None
+        raw = f"{settings.agents.OPENAI_MODEL}|{settings.agents.PROMPT_VERSION}|{normalized}"
+        return f"{self.namespace}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+    async def get(self, topic: str) -> Optional[str]:
+        key = self.key(topic)
+        if key is None:
+            return None
+
+        entry = self._l1.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._l1.move_to_end(key)
+                self.l1_hits += 1
+                return value
+            del self._l1[key]
+
+        try:
+            value = await self.redis.get(key)
+        except RedisError as e:
+            logger.warning(f"Кеш результатов недоступен в Redis: {e}")
+            value = None
+
+        if value is None:
+            self.misses += 1
+            return None
+
+        value = value.decode()
+        self._set_l1(key, value)
+        self.l2_hits += 1
+        return value
+
+    async def set(self, topic: str, value: str) -> None:
+        key = self.key(topic)
+        if key is None:
+            return
+
+        self._set_l1(key, value)
+        try:
+            await self.redis.set(key, value, ex=self.ttl)
+        except RedisError as e:
+            logger.warning(f"Не удалось сохранить результат в Redis: {e}")
+
+    async def invalidate(self, topic: Optional[str] = None) -> int:
+        """Удаляет одну тему или, без аргумента, весь кеш — например,
+        после изменения промптов. Возвращает число удалённых ключей Redis."""
+        if topic is not None:
+            key = self.key(topic)
+            if key is None:
+                return 0
+            self._l1.pop(key, None)
+            return await self.redis.delete(key)
+
+        self._l1.clear()
+        deleted = 0
+        async for key in self.redis.scan_iter(match=f"{self.namespace}:*", count=500):
+            deleted += await self.redis.delete(key)
+        return deleted
+
+    def stats(self) -> dict:
+        lookups = self.l1_hits + self.l2_hits + self.misses
+        return {
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "hit_rate": (self.l1_hits + self.l2_hits) / lookups if lookups else 0.0,
+            "l1_size": len(self._l1),
+        }
+
+    def _set_l1(self, key: str, value: str) -> None:
+        self._l1[key] = (time.monotonic() + self.l1_ttl, value)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.max_size:
+            self._l1.popitem(last=False)
@@ -0,0 +1,60 @@
+from typing import Optional
+from config import settings
+from agents.deadline import Deadline
+
+# Грубая оценка без токенизатора: для кириллицы выходит около 3 символов
+# на токен, поэтому оценка получается с запасом.
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """Обрезает текст так, чтобы его оценка не превышала max_tokens."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars]
+
+
+class TaskContext:
+    """Переписка одного запроса: создаётся заново в каждом process_task
+    и живёт не дольше него, поэтому промпт не растёт со временем работы."""
+
+    def __init__(
+        self,
+        topic: str,
+        token_budget: Optional[int] = None,
+        max_input_tokens: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+        model: Optional[str] = None,
+    ):
+        self.token_budget = token_budget or settings.agents.CONTEXT_TOKEN_BUDGET
+        max_input_tokens = max_input_tokens or settings.agents.MAX_INPUT_TOKENS
+        self.topic = truncate_text(topic.strip(), min(max_input_tokens, self.token_budget // 2))
+        self.messages: list[dict] = []
+        self.deadline = deadline or Deadline(settings.agents.TASK_DEADLINE)
+        self.model = model or settings.agents.OPENAI_MODEL
+
+    def add(self, role: str, content: str) -> None:
+        self.messages.append({"role": role, "content": content})
+
+    def build(self, system_prompt: str, messages: Optional[list[dict]] = None) -> list[dict]:
+        """Собирает промпт в пределах бюджета. Первое сообщение (тема)
+        сохраняется, из остальных отбрасываются самые старые, а последнее
+        при необходимости обрезается."""
+        messages = list(self.messages if messages is None else messages)
+        budget = self.token_budget - estimate_tokens(system_prompt)
+
+        def used() -> int:
+            return sum(estimate_tokens(m["content"]) for m in messages)
+
+        while len(messages) > 2 and used() > budget:
+            messages.pop(1)
+        if messages and used() > budget:
+            rest = budget - used() + estimate_tokens(messages[-1]["content"])
+            messages[-1] = {**messages[-1], "content": truncate_text(messages[-1]["content"], max(rest, 1))}
+
+        return [{"role": "system", "content": system_prompt}, *messages]
@@ -0,0 +1,109 @@
+import asyncio
+import random
+import time
+from functools import lru_cache
+from typing import Awaitable, Callable, Optional, TypeVar
+from loguru import logger
+from config import settings
+from metrics import LLM_RETRIES, LLM_HEDGES
+from agents.policy import provider_health
+
+T = TypeVar("T")
+
+
+@lru_cache()
+def retriable_errors() -> tuple:
+    """Временные ошибки, после которых запрос повторяется. openai
+    импортируется при первой ошибке, а не при запуске бота."""
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+    return (
+        APIConnectionError,
+        APITimeoutError,
+        InternalServerError,
+        RateLimitError,
+        asyncio.TimeoutError,
+    )
+
+
+class DeadlineExceeded(Exception):
+    """Время на обработку задания истекло."""
+
+
+class Deadline:
+    """Крайний срок обработки одного задания."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Таймаут очередного вызова: не больше cap и остатка срока."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded()
+        return remaining if cap is None else min(cap, remaining)
+
+
+async def _hedged(factory: Callable[[], Awaitable[T]], delay: float) -> T:
+    """Если первый запрос не ответил за delay секунд, параллельно
+    отправляется дубль; возвращается первый успешный ответ."""
+    tasks = [asyncio.ensure_future(factory())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            LLM_HEDGES.inc()
+            tasks.append(asyncio.ensure_future(factory()))
+
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def call_with_deadline(
+    factory: Callable[[], Awaitable[T]],
+    deadline: Optional[Deadline] = None,
+    hedge: bool = False,
+) -> T:
+    """Вызывает factory() с таймаутом на попытку, повторяет при временных
+    ошибках с экспоненциальной задержкой и случайным разбросом и не
+    выходит за deadline. При hedge медленный запрос дублируется."""
+    agents = settings.agents
+    attempts = agents.LLM_RETRIES + 1
+    for attempt in range(attempts):
+        timeout = deadline.timeout(agents.LLM_CALL_TIMEOUT) if deadline else agents.LLM_CALL_TIMEOUT
+        start = time.perf_counter()
+        try:
+            if hedge and agents.HEDGE_DELAY > 0:
+                result = await asyncio.wait_for(_hedged(factory, agents.HEDGE_DELAY), timeout)
+            else:
+                result = await asyncio.wait_for(factory(), timeout)
+            provider_health.record(time.perf_counter() - start, ok=True)
+            return result
+        except retriable_errors() as e:
+            provider_health.record(time.perf_counter() - start, ok=False)
+            if attempt == attempts - 1:
+                raise
+            delay = random.uniform(0, agents.LLM_RETRY_BASE_DELAY * 2 ** attempt)
+            if deadline is not None and delay >= deadline.remaining():
+                raise
+            LLM_RETRIES.inc()
+            logger.warning(f"Повтор запроса к модели через {delay:.2f} с после ошибки: {e!r}")
+            await asyncio.sleep(delay)
+    raise DeadlineExceeded()
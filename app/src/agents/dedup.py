@@ -0,0 +1,145 @@
+import hashlib
+from array import array
+from typing import Optional
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from agents.cache import normalize_topic
+from config import settings
+from clients import clients
+
+# Простое число Мерсенна для универсального хеширования перестановок.
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+class MinHasher:
+    """MinHash по символьным шинглам нормализованного текста."""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.permutations = [
+            (
+                _hash64(f"{seed}:a:{i}".encode()) % (MERSENNE_PRIME - 1) + 1,
+                _hash64(f"{seed}:b:{i}".encode()) % MERSENNE_PRIME,
+            )
+            for i in range(num_perm)
+        ]
+
+    def shingles(self, text: str) -> set[str]:
+        text = normalize_topic(text)
+        if len(text) <= self.shingle_size:
+            return {text} if text else set()
+        return {text[i:i + self.shingle_size] for i in range(len(text) - self.shingle_size + 1)}
+
+    def signature(self, text: str) -> Optional[array]:
+        hashes = [_hash64(s.encode()) for s in self.shingles(text)]
+        if not hashes:
+            return None
+        return array("Q", (
+            min((a * h + b) % MERSENNE_PRIME for h in hashes)
+            for a, b in self.permutations
+        ))
+
+    @staticmethod
+    def similarity(left: array, right: array) -> float:
+        return sum(x == y for x, y in zip(left, right)) / len(left)
+
+
+class NearDuplicateIndex:
+    """LSH-индекс по MinHash-сигнатурам прошлых заданий в Redis.
+
+    Сигнатура делится на bands полос; задания, совпавшие хотя бы в одной
+    полосе, становятся кандидатами, и для них оценивается сходство.
+    Сигнатура хранится компактно — num_perm восьмибайтовых чисел.
+    """
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        threshold: Optional[float] = None,
+        num_perm: int = 64,
+        bands: int = 16,
+        ttl: Optional[int] = None,
+        namespace: str = "ttc:dedup",
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm должно делиться на bands без остатка.")
+        self.redis = Redis.from_url(redis_url) if redis_url else clients.redis()
+        self.threshold = threshold or settings.cache.DEDUP_THRESHOLD
+        self.hasher = MinHasher(num_perm=num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ttl = ttl or settings.cache.CACHE_TTL
+        self.namespace = f"{namespace}:{settings.agents.OPENAI_MODEL}:{settings.agents.PROMPT_VERSION}"
+
+    def _band_keys(self, signature: array) -> list[str]:
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(rows.tobytes(), digest_size=8).hexdigest()
+            keys.append(f"{self.namespace}:band:{band}:{digest}")
+        return keys
+
+    def _doc_key(self, doc_id: str) -> str:
+        return f"{self.namespace}:doc:{doc_id}"
+
+    async def find(self, text: str) -> Optional[str]:
+        """Возвращает сохранённый ответ на самое похожее задание,
+        если его сходство не ниже порога."""
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return None
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in self._band_keys(signature):
+                    pipe.smembers(key)
+                buckets = await pipe.execute()
+
+            candidates = sorted(set().union(*buckets))
+            if not candidates:
+                return None
+
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for doc_id in candidates:
+                    pipe.hmget(self._doc_key(doc_id.decode()), "sig", "answer")
+                docs = await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Индекс похожих заданий недоступен: {e}")
+            return None
+
+        best_score, best_answer = 0.0, None
+        for raw_signature, answer in docs:
+            if raw_signature is None or answer is None:
+                continue
+            score = self.hasher.similarity(signature, array("Q", raw_signature))
+            if score > best_score:
+                best_score, best_answer = score, answer
+
+        if best_answer is None or best_score < self.threshold:
+            return None
+        logger.info(f"Найдено похожее задание, сходство {best_score:.2f}")
+        return best_answer.decode()
+
+    async def add(self, text: str, answer: str) -> None:
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return
+
+        doc_id = hashlib.sha1(normalize_topic(text).encode()).hexdigest()
+        doc_key = self._doc_key(doc_id)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hset(doc_key, mapping={"sig": signature.tobytes(), "answer": answer})
+                pipe.expire(doc_key, self.ttl)
+                for key in self._band_keys(signature):
+                    pipe.sadd(key, doc_id)
+                    pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Не удалось добавить задание в индекс похожих: {e}")
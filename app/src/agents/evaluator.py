@@ -1,36 +1,148 @@
-from openai import AsyncOpenAI
+import asyncio
+from typing import TYPE_CHECKING, Optional
+from loguru import logger
 from config import settings
+from clients import clients
+from agents.context import TaskContext, truncate_text, estimate_tokens
+from agents.deadline import call_with_deadline
+from agents.prescorer import PreScorer, parse_choice
+from metrics import track_llm_call, observe_usage, EVALUATIONS
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+SYSTEM_PROMPT = "Вы являетесь интеллектуальным помощником, который получает пронумерованные тексты (всего {count}). Ваша задача — проанализировать их и ответить только числом от 1 до {count}, в зависимости от того, какой текст вы считаете лучшим. Не давайте объяснений и не добавляйте ничего лишнего в ответ."
 
 class EvaluatorAgent:
     def __init__(self):
-        self.client = AsyncOpenAI(
-            api_key = settings.OPENAI_API_KEY
-        )
-
-        self.message = [
-            {
-                "role": "system",
-                "content": "Вы являетесь интеллектуальным помощником, который получает три текста. Ваша задача — проанализировать их и ответить только числом 1, 2 или 3, в зависимости от того, какой текст вы считаете лучшим. Не давайте объяснений и не добавляйте ничего лишнего в ответ."
-            },
-        ]
-
-    async def evaluate_content(self, variants: list[str]) -> str:
-        content = ""
+        self.prescorer = PreScorer()
 
-        for idx, text in enumerate(variants, start=1):
-            content += f"Текст №{idx}: {text}\n{'-'*50}"
-            
+    @property
+    def client(self) -> "AsyncOpenAI":
+        return clients.openai()
+
+    async def evaluate_content(self, ctx: TaskContext, variants: list[str], use_model: bool = True) -> str:
+        """Лучший из вариантов. Без use_model выбор делается только
+        локальной оценкой, без вызова модели."""
+        if not variants:
+            raise ValueError("Нет вариантов для оценки.")
+        if len(variants) == 1:
+            EVALUATIONS.inc(outcome="single")
+            return variants[0]
+
+        decision = None
+        candidates = list(range(len(variants)))
+        if settings.agents.PRESCORE_ENABLED:
+            decision = self.prescorer.decide(ctx.topic, variants)
+            if decision.winner is not None:
+                EVALUATIONS.inc(outcome=decision.reason)
+                return variants[decision.winner]
+            candidates = decision.candidates
+
+        if not use_model:
+            EVALUATIONS.inc(outcome="skipped")
+            best = self.prescorer.best(decision) if decision is not None else candidates[0]
+            return variants[best]
+
+        if self.use_tournament(len(candidates)):
+            EVALUATIONS.inc(outcome="tournament")
+            scores = decision.scores if decision is not None else [None] * len(variants)
+            return variants[await self.run_tournament(ctx, variants, candidates, scores)]
+
+        try:
+            choice = await call_with_deadline(
+                lambda: self.ask_model(ctx, [variants[i] for i in candidates]),
+                ctx.deadline,
+            )
+        except Exception as e:
+            # Оценщик не успел или упал: отвечаем лучшим из того, что есть.
+            logger.warning(f"Оценка вариантов не выполнена: {e!r}")
+            EVALUATIONS.inc(outcome="fallback")
+            best = self.prescorer.best(decision) if decision is not None else candidates[0]
+            return variants[best]
 
-        self.message.append({
-            "role": "user",
-            "content": f"{content}"
-        })
+        if choice is None:
+            # Ответ оценщика не распознан: берём лучший по локальной оценке.
+            EVALUATIONS.inc(outcome="unparsed")
+            best = self.prescorer.best(decision) if decision is not None else candidates[0]
+            return variants[best]
 
-        response = await self.client.chat.completions.create(
-            model="gpt-4o",
-            messages=self.message
-        )
+        EVALUATIONS.inc(outcome="llm")
+        return variants[candidates[choice - 1]]
+
+    @staticmethod
+    def use_tournament(count: int) -> bool:
+        mode = settings.agents.EVALUATION_MODE
+        if mode == "auto":
+            return count >= settings.agents.TOURNAMENT_MIN_CANDIDATES
+        return mode == "tournament"
+
+    async def run_tournament(
+        self,
+        ctx: TaskContext,
+        variants: list[str],
+        candidates: list[int],
+        scores: list[Optional[float]],
+    ) -> int:
+        """Индекс победителя турнира на выбывание.
+
+        В каждом раунде кандидаты делятся на группы по TOURNAMENT_GROUP_SIZE,
+        группы сравниваются параллельно, дальше проходят их победители.
+        Промпт одного сравнения не зависит от числа кандидатов, а раундов
+        получается логарифм от их числа.
+        """
+        size = max(settings.agents.TOURNAMENT_GROUP_SIZE, 2)
+        remaining = list(candidates)
+        while len(remaining) > 1:
+            groups = [remaining[i:i + size] for i in range(0, len(remaining), size)]
+            remaining = list(await asyncio.gather(*(
+                self.compare(ctx, variants, group, scores) for group in groups
+            )))
+        return remaining[0]
+
+    async def compare(
+        self,
+        ctx: TaskContext,
+        variants: list[str],
+        group: list[int],
+        scores: list[Optional[float]],
+    ) -> int:
+        """Победитель одной группы турнира; без ответа модели — лучший
+        по локальной оценке."""
+        if len(group) == 1:
+            return group[0]
+        try:
+            choice = await call_with_deadline(
+                lambda: self.ask_model(ctx, [variants[i] for i in group]),
+                ctx.deadline,
+            )
+        except Exception as e:
+            logger.warning(f"Сравнение вариантов в турнире не выполнено: {e!r}")
+            choice = None
+        if choice is None:
+            return max(group, key=lambda i: scores[i] or 0.0)
+        return group[choice - 1]
+
+    async def ask_model(self, ctx: TaskContext, variants: list[str]) -> Optional[int]:
+        """Номер лучшего варианта (с единицы) по мнению модели или None."""
+        system_prompt = SYSTEM_PROMPT.format(count=len(variants))
+        # Бюджет делится поровну между вариантами, чтобы длинный текст
+        # не вытеснил остальные из промпта.
+        per_variant = (ctx.token_budget - estimate_tokens(system_prompt)) // len(variants) - 20
+        content = ""
+
+        for idx, text in enumerate(variants, start=1):
+            content += f"Текст №{idx}: {truncate_text(text, max(per_variant, 1))}\n{'-'*50}"
 
-        best_variant = response.choices[0].message.content
+        model = ctx.model
+        with track_llm_call("evaluator", model):
+            response = await self.client.chat.completions.create(
+                model=model,
+                messages=ctx.build(system_prompt, [{
+                    "role": "user",
+                    "content": f"{content}"
+                }])
+            )
+        observe_usage("evaluator", model, response.usage)
 
-        return variants[int(best_variant) - 1]
\ No newline at end of file
+        return parse_choice(response.choices[0].message.content, len(variants))
@@ -1,55 +1,220 @@
-from openai import AsyncOpenAI
+import asyncio
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+from loguru import logger
 from config import settings
+from clients import clients
+from agents.context import TaskContext
+from agents.deadline import Deadline, call_with_deadline
+from metrics import track_llm_call, observe_usage
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+VARIANT_SYSTEM_PROMPT = (
+    "Вы — интеллектуальный помощник, который генерирует текст по теме, "
+    "присланной пользователем, следуя указанию к варианту. Не добавляйте "
+    "никаких пояснений или лишней информации в ответ."
+)
+
+# Указание и температура для каждого варианта: разнообразие текстов
+# достигается ими, а не общей перепиской, поэтому запросы независимы.
+VARIANT_STYLES = [
+    ("Напишите строгий и информативный текст.", 0.5),
+    ("Напишите живой и образный текст, отличающийся по стилю от строгого изложения.", 0.9),
+    ("Напишите краткий и структурированный текст с неожиданным углом зрения.", 1.1),
+]
+
+BATCH_SYSTEM_PROMPT = (
+    "Вы — интеллектуальный помощник, который генерирует текст по теме, "
+    "присланной пользователем. Не добавляйте никаких пояснений или лишней "
+    "информации в ответ."
+)
+BATCH_TEMPERATURE = 1.0
+
+ProgressCallback = Callable[[str], Awaitable[None]]
+
+SEQUENTIAL_SYSTEM_PROMPT = (
+    "Вы — интеллектуальный помощник, который генерирует текст "
+    "в зависимости от темы и номера запроса. Сначала пользователь "
+    "отправляет тему, на основании которой будут генерироваться тексты. "
+    "Затем пользователь отправляет номер текста. Если пользователь "
+    "отправляет число N, вы должны сгенерировать текст №N по указанной "
+    "теме, отличающийся от уже сгенерированных. Всегда генерируйте текст только на основании темы и числа, "
+    "предоставленных пользователем. Не добавляйте никаких пояснений "
+    "или лишней информации в ответ."
+)
 
 class GeneratorAgent:
-    def __init__(self):
-        self.client = AsyncOpenAI(
-            api_key=settings.OPENAI_API_KEY
+    @property
+    def client(self) -> "AsyncOpenAI":
+        return clients.openai()
+
+    async def generate_content(
+        self,
+        ctx: TaskContext,
+        on_progress: Optional[ProgressCallback] = None,
+        count: Optional[int] = None,
+    ) -> list[str]:
+        """Генерирует count вариантов (по умолчанию CANDIDATE_COUNT).
+        on_progress получает накопленный текст первого варианта по мере
+        его генерации; без него ответы запрашиваются целиком."""
+        count = count or settings.agents.CANDIDATE_COUNT
+        mode = settings.agents.GENERATION_MODE
+        if mode == "sequential":
+            return await self.generate_sequential(ctx, count, on_progress)
+        if mode == "batched":
+            return await self.generate_batched(ctx, count, on_progress)
+        return await self.generate_concurrent(ctx, count, on_progress)
+
+    async def complete(
+        self,
+        messages: list[dict],
+        temperature: Optional[float] = None,
+        on_progress: Optional[ProgressCallback] = None,
+        deadline: Optional[Deadline] = None,
+        model: Optional[str] = None,
+    ) -> str:
+        variants = await self.complete_many(messages, 1, temperature, on_progress, deadline, model)
+        return variants[0]
+
+    async def complete_many(
+        self,
+        messages: list[dict],
+        n: int,
+        temperature: Optional[float] = None,
+        on_progress: Optional[ProgressCallback] = None,
+        deadline: Optional[Deadline] = None,
+        model: Optional[str] = None,
+    ) -> list[str]:
+        """Запрашивает n вариантов ответа одним вызовом (параметр n API)
+        с таймаутами и повторами в пределах deadline. Запрос без потоковой
+        выдачи может дублироваться, если отвечает слишком долго."""
+        return await call_with_deadline(
+            lambda: self._request(messages, n, temperature, on_progress, model or settings.agents.OPENAI_MODEL),
+            deadline,
+            hedge=on_progress is None,
         )
-        self.messages = [
-            {
-                "role": "system",
-                "content": (
-                    "Вы — интеллектуальный помощник, который генерирует текст "
-                    "в зависимости от темы и номера запроса. Сначала пользователь "
-                    "отправляет тему, на основании которой будут генерироваться тексты. "
-                    "Затем пользователь отправляет число: 1, 2 или 3. Если пользователь "
-                    "отправляет 1, вы должны сгенерировать текст №1 по указанной теме. "
-                    "Если пользователь отправляет 2, вы должны сгенерировать текст №2. "
-                    "Если пользователь отправляет 3, вы должны сгенерировать текст №3. "
-                    "Всегда генерируйте текст только на основании темы и числа, "
-                    "предоставленных пользователем. Не добавляйте никаких пояснений "
-                    "или лишней информации в ответ."
-                )
-            },
-        ]
 
-    async def generate_content(self, topic: str) -> list[str]:
+    async def _request(
+        self,
+        messages: list[dict],
+        n: int,
+        temperature: Optional[float],
+        on_progress: Optional[ProgressCallback],
+        model: str,
+    ) -> list[str]:
+        params = {"model": model, "messages": messages}
+        if n > 1:
+            params["n"] = n
+        if temperature is not None:
+            params["temperature"] = temperature
+
+        if on_progress is None:
+            with track_llm_call("generator", model):
+                response = await self.client.chat.completions.create(**params)
+            observe_usage("generator", model, response.usage)
+            choices = sorted(response.choices, key=lambda choice: choice.index)
+            return [choice.message.content or "" for choice in choices]
+
+        parts: list[list[str]] = [[] for _ in range(n)]
+        with track_llm_call("generator", model):
+            stream = await self.client.chat.completions.create(
+                stream=True, stream_options={"include_usage": True}, **params
+            )
+            async for chunk in stream:
+                # Последний фрагмент потока несёт только статистику токенов.
+                if chunk.usage is not None:
+                    observe_usage("generator", model, chunk.usage)
+                for choice in chunk.choices:
+                    delta = choice.delta.content
+                    if not delta:
+                        continue
+                    parts[choice.index].append(delta)
+                    if choice.index == 0:
+                        await on_progress("".join(parts[0]))
+        return ["".join(choice_parts) for choice_parts in parts]
+
+    async def generate_batched(
+        self, ctx: TaskContext, count: int, on_progress: Optional[ProgressCallback] = None
+    ) -> list[str]:
+        """Все варианты одним запросом с общим промптом: входные токены
+        оплачиваются и обрабатываются один раз, а не count раз."""
+        return await self.complete_many(
+            ctx.build(BATCH_SYSTEM_PROMPT, [
+                {"role": "user", "content": f"Тема {ctx.topic}"},
+            ]),
+            count,
+            temperature=BATCH_TEMPERATURE,
+            on_progress=on_progress,
+            deadline=ctx.deadline,
+            model=ctx.model,
+        )
+
+    async def generate_concurrent(
+        self, ctx: TaskContext, count: int, on_progress: Optional[ProgressCallback] = None
+    ) -> list[str]:
+        """Все варианты запрашиваются одновременно, каждый со своим промптом.
+        Варианты, не уложившиеся в срок или завершившиеся ошибкой,
+        отбрасываются, если есть хотя бы один готовый; пустые ответы
+        отбрасываются тоже."""
+        results = await asyncio.gather(
+            *(
+                self.generate_variant(ctx, i, on_progress if i == 1 else None)
+                for i in range(1, count + 1)
+            ),
+            return_exceptions=True,
+        )
+        variants = [result for result in results if isinstance(result, str) and result]
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if not variants and errors:
+            raise errors[0]
+        if not variants:
+            raise ValueError(f"Ни один из {count} вариантов не получен: модель вернула пустые ответы.")
+        if errors:
+            logger.warning(f"Получено {len(variants)} вариантов из {count}: {errors[0]!r}")
+        return variants
+
+    async def generate_variant(
+        self, ctx: TaskContext, number: int, on_progress: Optional[ProgressCallback] = None
+    ) -> str:
+        instruction, temperature = VARIANT_STYLES[(number - 1) % len(VARIANT_STYLES)]
+
+        return await self.complete(
+            ctx.build(VARIANT_SYSTEM_PROMPT, [
+                {"role": "user", "content": f"Тема {ctx.topic}\nВариант №{number}. {instruction}"},
+            ]),
+            temperature=temperature,
+            on_progress=on_progress,
+            deadline=ctx.deadline,
+            model=ctx.model,
+        )
+
+    async def generate_sequential(
+        self, ctx: TaskContext, count: int, on_progress: Optional[ProgressCallback] = None
+    ) -> list[str]:
         variants = []
 
-        self.messages.append({
-            "role": "user",
-            "content": f"Тема {topic}"
-        })
+        ctx.add("user", f"Тема {ctx.topic}")
 
-        for i in range(1, 4):
-            self.messages.append({
-                "role": "user",
-                "content": str(i)
-            })
+        for i in range(1, count + 1):
+            ctx.add("user", str(i))
 
-            response = await self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=self.messages
-            )
-            full_answer = response.choices[0].message.content
+            try:
+                full_answer = await self.complete(
+                    ctx.build(SEQUENTIAL_SYSTEM_PROMPT),
+                    on_progress=on_progress if i == 1 else None,
+                    deadline=ctx.deadline,
+                    model=ctx.model,
+                )
+            except Exception as e:
+                if not variants:
+                    raise
+                logger.warning(f"Получено {len(variants)} вариантов из {count}: {e!r}")
+                break
 
             variants.append(full_answer)
 
-            self.messages.append({
-                "role": "assistant",
-                "content": full_answer
-            })
+            ctx.add("assistant", full_answer)
 
         return variants
 
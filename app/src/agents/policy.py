@@ -0,0 +1,142 @@
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+from loguru import logger
+from config import settings
+from metrics import ADAPTIVE_DECISIONS, ADAPTIVE_LEVEL
+
+# Уровни деградации: 0 — полное качество, дальше всё дешевле.
+LEVEL_NAMES = ("full", "reduced", "economy", "minimal")
+
+# Меньше запросов за окно — доля ошибок не считается, чтобы одна
+# случайная ошибка не переключала модель.
+MIN_CALLS = 10
+
+
+class ProviderHealth:
+    """Задержки и ошибки запросов к модели за последние window секунд."""
+
+    def __init__(self, window: Optional[float] = None):
+        self.window = window or settings.agents.ADAPTIVE_WINDOW
+        self._calls: deque[tuple[float, float, bool]] = deque()
+
+    def record(self, latency: float, ok: bool) -> None:
+        now = time.monotonic()
+        self._calls.append((now, latency, ok))
+        self._trim(now)
+
+    def _trim(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    def stats(self) -> tuple[float, float]:
+        """Средняя задержка успешных запросов и доля ошибок."""
+        self._trim(time.monotonic())
+        latencies = [latency for _, latency, ok in self._calls if ok]
+        errors = sum(not ok for _, _, ok in self._calls)
+        latency = sum(latencies) / len(latencies) if latencies else 0.0
+        error_rate = errors / len(self._calls) if len(self._calls) >= MIN_CALLS else 0.0
+        return latency, error_rate
+
+
+provider_health = ProviderHealth()
+
+
+class Plan:
+    def __init__(self, level: int, candidates: int, model: str, evaluate: bool, reason: str):
+        self.level = level
+        self.candidates = candidates
+        self.model = model
+        self.evaluate = evaluate
+        self.reason = reason
+
+    def __repr__(self):
+        return (
+            f"<Plan(level={LEVEL_NAMES[self.level]}, candidates={self.candidates}, "
+            f"model={self.model}, evaluate={self.evaluate}, reason={self.reason})>"
+        )
+
+
+class AdaptivePolicy:
+    """Выбирает, сколько вариантов генерировать, какой моделью и звать ли
+    оценщика, по текущей нагрузке и недавнему поведению OpenAI.
+
+    Нагрузка — задания в работе и в очереди на один воркер. Уровень
+    повышается сразу, а снижается на одну ступень не чаще, чем раз
+    в ADAPTIVE_COOLDOWN секунд, чтобы не качаться на границе порога.
+    """
+
+    def __init__(self, health: ProviderHealth = provider_health):
+        self.health = health
+        self.in_flight = 0
+        # Длина очереди заданий; задаётся тем, кто эту очередь создаёт.
+        self.backlog: Optional[Callable[[], Awaitable[int]]] = None
+        self.level = 0
+        self._changed_at = 0.0
+
+    async def pressure(self) -> float:
+        pending = self.in_flight
+        if self.backlog is not None:
+            try:
+                pending += await self.backlog()
+            except Exception as e:
+                logger.warning(f"Не удалось узнать длину очереди заданий: {e}")
+        return pending / max(settings.jobs.JOB_WORKERS, 1)
+
+    def target_level(self, pressure: float, latency: float, error_rate: float) -> tuple[int, str]:
+        agents = settings.agents
+        level, reason = 0, "normal"
+        for step, threshold in enumerate(agents.ADAPTIVE_LOAD_LEVELS, start=1):
+            if pressure >= threshold:
+                level, reason = step, "load"
+        if agents.ADAPTIVE_SLOW_LATENCY and latency >= agents.ADAPTIVE_SLOW_LATENCY and level < 1:
+            level, reason = 1, "latency"
+        if error_rate >= agents.ADAPTIVE_ERROR_RATE and level < 2:
+            # Основная модель сбоит: переходим на запасную.
+            level, reason = 2, "errors"
+        return min(level, len(LEVEL_NAMES) - 1), reason
+
+    async def plan(self) -> Plan:
+        agents = settings.agents
+        if not agents.ADAPTIVE_ENABLED:
+            return Plan(0, agents.CANDIDATE_COUNT, agents.OPENAI_MODEL, True, "disabled")
+
+        pressure = await self.pressure()
+        latency, error_rate = self.health.stats()
+        target, reason = self.target_level(pressure, latency, error_rate)
+
+        now = time.monotonic()
+        previous = self.level
+        if target > self.level:
+            self.level = target
+            self._changed_at = now
+        elif target < self.level and now - self._changed_at >= agents.ADAPTIVE_COOLDOWN:
+            self.level -= 1
+            self._changed_at = now
+            reason = "recovery"
+        elif target < self.level:
+            reason = "cooldown"
+
+        plan = self._plan_for(self.level, reason)
+        ADAPTIVE_DECISIONS.inc(level=LEVEL_NAMES[plan.level], reason=reason)
+        ADAPTIVE_LEVEL.set(plan.level)
+        if plan.level != previous:
+            logger.info(
+                f"Уровень качества {LEVEL_NAMES[previous]} -> {LEVEL_NAMES[plan.level]}: "
+                f"нагрузка {pressure:.2f}, задержка {latency:.1f} с, ошибки {error_rate:.0%}"
+            )
+        logger.debug("Решение политики: {} (нагрузка {:.2f})", plan, pressure)
+        return plan
+
+    def _plan_for(self, level: int, reason: str) -> Plan:
+        agents = settings.agents
+        fallback_model = agents.FALLBACK_MODEL or agents.OPENAI_MODEL
+        reduced = min(agents.ADAPTIVE_REDUCED_CANDIDATES, agents.CANDIDATE_COUNT)
+        if level == 0:
+            return Plan(0, agents.CANDIDATE_COUNT, agents.OPENAI_MODEL, True, reason)
+        if level == 1:
+            return Plan(1, reduced, agents.OPENAI_MODEL, True, reason)
+        if level == 2:
+            # Лучший вариант выбирается локальной оценкой без вызова оценщика.
+            return Plan(2, reduced, fallback_model, False, reason)
+        return Plan(3, 1, fallback_model, False, reason)
@@ -0,0 +1,106 @@
+import re
+from typing import Optional
+from config import settings
+
+# Начала типичных отказов модели; такой вариант не показывается пользователю.
+REFUSAL_MARKERS = (
+    "извините, но я не могу",
+    "к сожалению, я не могу",
+    "я не могу помочь",
+    "я не могу выполнить",
+    "i'm sorry",
+    "i am sorry",
+    "i can't help",
+    "i cannot help",
+    "as an ai",
+)
+
+MIN_LENGTH = 20
+TARGET_LENGTH = 400
+MAX_LENGTH = 4096
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+CYRILLIC_RE = re.compile(r"[а-яё]", re.IGNORECASE)
+LATIN_RE = re.compile(r"[a-z]", re.IGNORECASE)
+
+
+def detect_script(text: str) -> Optional[str]:
+    cyrillic = len(CYRILLIC_RE.findall(text))
+    latin = len(LATIN_RE.findall(text))
+    if not cyrillic and not latin:
+        return None
+    return "cyrillic" if cyrillic >= latin else "latin"
+
+
+def is_refusal(text: str) -> bool:
+    head = text[:200].lower()
+    return any(marker in head for marker in REFUSAL_MARKERS)
+
+
+class PreScoreDecision:
+    def __init__(self, winner: Optional[int], candidates: list[int], scores: list[Optional[float]], reason: str):
+        self.winner = winner
+        self.candidates = candidates
+        self.scores = scores
+        self.reason = reason
+
+
+class PreScorer:
+    """Дешёвая локальная оценка вариантов без обращения к модели.
+
+    Пустые, слишком короткие ответы и отказы отбрасываются; остальные
+    получают оценку от 0 до 1 по длине, повторам и совпадению языка
+    с темой. Если годный вариант один или лидер отрывается от второго
+    места больше чем на margin, вызов оценщика не нужен.
+    """
+
+    def __init__(self, margin: Optional[float] = None):
+        self.margin = settings.agents.PRESCORE_MARGIN if margin is None else margin
+
+    def score(self, topic: str, text: Optional[str]) -> Optional[float]:
+        if not text or len(text.strip()) < MIN_LENGTH or is_refusal(text):
+            return None
+
+        length = len(text)
+        length_score = min(length / TARGET_LENGTH, 1.0)
+        if length > MAX_LENGTH:
+            length_score *= MAX_LENGTH / length
+
+        words = [word.lower() for word in WORD_RE.findall(text)]
+        trigrams = list(zip(words, words[1:], words[2:]))
+        repetition_score = len(set(trigrams)) / len(trigrams) if trigrams else 0.5
+
+        topic_script = detect_script(topic)
+        language_score = 1.0 if topic_script is None or topic_script == detect_script(text) else 0.0
+
+        return 0.3 * length_score + 0.4 * repetition_score + 0.3 * language_score
+
+    def decide(self, topic: str, variants: list[str]) -> PreScoreDecision:
+        scores = [self.score(topic, text) for text in variants]
+        valid = [i for i, score in enumerate(scores) if score is not None]
+
+        if not valid:
+            # Отбраковано всё: пусть выбирает оценщик из всех вариантов.
+            return PreScoreDecision(None, list(range(len(variants))), scores, "no_valid")
+        if len(valid) == 1:
+            return PreScoreDecision(valid[0], valid, scores, "single_valid")
+
+        ranked = sorted(valid, key=lambda i: scores[i], reverse=True)
+        if scores[ranked[0]] - scores[ranked[1]] >= self.margin:
+            return PreScoreDecision(ranked[0], valid, scores, "clear_winner")
+        return PreScoreDecision(None, valid, scores, "llm")
+
+    def best(self, decision: PreScoreDecision) -> int:
+        """Лучший по локальной оценке вариант среди кандидатов."""
+        return max(decision.candidates, key=lambda i: decision.scores[i] or 0.0)
+
+
+def parse_choice(reply: Optional[str], count: int) -> Optional[int]:
+    """Номер выбранного текста (с единицы) из ответа оценщика или None."""
+    if not reply:
+        return None
+    for match in re.findall(r"\d+", reply):
+        number = int(match)
+        if 1 <= number <= count:
+            return number
+    return None
@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import secrets
+import time
+from typing import Awaitable, Callable, Optional
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from agents.cache import normalize_topic
+from agents.generator import ProgressCallback
+from config import settings
+from clients import clients
+from metrics import SINGLEFLIGHT
+
+# Снимает или продлевает блокировку, только если она ещё наша: после
+# истечения TTL ключ мог занять другой процесс.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+Compute = Callable[[Optional[ProgressCallback]], Awaitable[str]]
+
+
+class Flight:
+    """Одно выполняющееся задание и те, кто ждёт его результата."""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.callbacks: list[ProgressCallback] = []
+        self.waiters = 0
+        # Результат посчитан другой репликой и получен через Redis.
+        self.remote = False
+
+    def progress_callback(self) -> Optional[ProgressCallback]:
+        """Функция для частичных ответов, только если их кто-то ждёт:
+        без неё генерация не стримит первый вариант и может хеджировать
+        запросы. Проверяется в момент запуска вычисления, так что
+        учитываются и те, кто присоединился, пока задание ждало блокировку."""
+        return self.progress if self.callbacks else None
+
+    async def progress(self, text: str) -> None:
+        """Рассылает частичный ответ всем, кто ждёт задание."""
+        for callback in list(self.callbacks):
+            try:
+                await callback(text)
+            except Exception as e:
+                logger.warning(f"Не удалось передать частичный ответ: {e}")
+
+
+class SingleFlight:
+    """Объединяет одинаковые задания, которые выполняются одновременно.
+
+    Задания с одной нормализованной темой внутри процесса ждут одно
+    вычисление; частичные ответы получают все ждущие. Между репликами
+    вычисление закрепляется блокировкой в Redis: остальные реплики
+    ждут, пока держатель блокировки не положит результат рядом с ней.
+    Если держатель упал, блокировка истекает или снимается без
+    результата, и задание берёт следующая реплика. Без Redis задания
+    объединяются только внутри процесса.
+    """
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        distributed: Optional[bool] = None,
+        namespace: str = "ttc:flight",
+    ):
+        config = settings.cache
+        if distributed is None:
+            distributed = config.SINGLEFLIGHT_DISTRIBUTED
+        self.redis: Optional[Redis] = None
+        if distributed:
+            self.redis = Redis.from_url(redis_url) if redis_url else clients.redis()
+            self._release = self.redis.register_script(RELEASE_SCRIPT)
+            self._extend = self.redis.register_script(EXTEND_SCRIPT)
+        self.namespace = namespace
+        self.lock_ttl = config.SINGLEFLIGHT_LOCK_TTL
+        self.result_ttl = config.SINGLEFLIGHT_RESULT_TTL
+        self.poll_interval = config.SINGLEFLIGHT_POLL_INTERVAL
+        self._flights: dict[str, Flight] = {}
+
+    def key(self, topic: str) -> Optional[str]:
+        normalized = normalize_topic(topic)
+        if not normalized:
+            return None
+        raw = f"{settings.agents.PROMPT_VERSION}|{normalized}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    async def do(self, topic: str, compute: Compute, on_progress: Optional[ProgressCallback] = None) -> str:
+        """Результат compute для темы; если такое же задание уже
+        выполняется, ждёт его вместо нового вычисления.
+
+        compute получает функцию для частичных ответов (None, если их
+        никто не ждёт) и вызывается не более одного раза на тему
+        одновременно. Кто присоединился к уже начатому без частичных
+        ответов вычислению, получает только итог. Вычисление отменяется,
+        только когда его перестали ждать все.
+        """
+        key = self.key(topic)
+        if key is None:
+            return await compute(on_progress)
+
+        flight = self._flights.get(key)
+        joined = flight is not None
+        if flight is None:
+            flight = self._flights[key] = Flight()
+            flight.task = asyncio.create_task(self._lead(key, compute, flight))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+
+        if on_progress is not None:
+            flight.callbacks.append(on_progress)
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if on_progress is not None:
+                flight.callbacks.remove(on_progress)
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+
+        SINGLEFLIGHT.inc(outcome="local" if joined else "remote" if flight.remote else "leader")
+        return result
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def _forget(self, key: str, flight: Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def _lead(self, key: str, compute: Compute, flight: Flight) -> str:
+        if self.redis is None:
+            return await compute(flight.progress_callback())
+
+        lock_key = f"{self.namespace}:{key}:lock"
+        result_key = f"{self.namespace}:{key}:result"
+        token = secrets.token_hex(8)
+        # Дольше срока задания ждать другую реплику нет смысла.
+        wait_until = time.monotonic() + settings.agents.TASK_DEADLINE + self.lock_ttl
+        waiting = False
+        while True:
+            try:
+                # Результат проверяется только после того, как блокировку
+                # застали занятой: задание, пришедшее позже, считается заново.
+                if waiting:
+                    value = await self.redis.get(result_key)
+                    if value is not None:
+                        flight.remote = True
+                        return value.decode()
+                acquired = await self.redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+            except RedisError as e:
+                logger.warning(f"Блокировка заданий в Redis недоступна, задание выполняется локально: {e}")
+                return await compute(flight.progress_callback())
+
+            if acquired:
+                break
+            if time.monotonic() >= wait_until:
+                logger.warning(f"Не дождались задания {key} на другой реплике, выполняется локально")
+                return await compute(flight.progress_callback())
+            waiting = True
+            await asyncio.sleep(self.poll_interval)
+
+        heartbeat = asyncio.create_task(self._keep_lock(lock_key, token))
+        try:
+            result = await compute(flight.progress_callback())
+            try:
+                await self.redis.set(result_key, result, ex=self.result_ttl)
+            except RedisError as e:
+                logger.warning(f"Не удалось передать результат задания другим репликам: {e}")
+            return result
+        finally:
+            heartbeat.cancel()
+            try:
+                await self._release(keys=[lock_key], args=[token])
+            except RedisError as e:
+                logger.warning(f"Не удалось снять блокировку задания {key}: {e}")
+
+    async def _keep_lock(self, lock_key: str, token: str) -> None:
+        """Продлевает блокировку, пока задание выполняется."""
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            try:
+                extended = await self._extend(keys=[lock_key], args=[token, int(self.lock_ttl * 1000)])
+            except RedisError as e:
+                logger.warning(f"Не удалось продлить блокировку задания: {e}")
+                continue
+            if not extended:
+                logger.warning(f"Блокировка {lock_key} потеряна, задание может выполниться дважды")
+                return
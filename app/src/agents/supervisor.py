@@ -1,16 +1,139 @@
-from agents.generator import GeneratorAgent
+import asyncio
+import time
+from functools import lru_cache
+from typing import Optional
+from loguru import logger
+from agents.generator import GeneratorAgent, ProgressCallback
 from agents.evaluator import EvaluatorAgent
+from agents.context import TaskContext
+from agents.cache import ResultCache
+from agents.dedup import NearDuplicateIndex
+from agents.policy import AdaptivePolicy, LEVEL_NAMES
+from agents.singleflight import SingleFlight
+from config import settings
+from tasks import task_log
 
 class Supervisor:
     def __init__(self):
         self.generator = GeneratorAgent()
         self.evaluator = EvaluatorAgent()
+        self.cache = ResultCache() if settings.cache.CACHE_ENABLED else None
+        self.dedup = NearDuplicateIndex() if settings.cache.DEDUP_ENABLED else None
+        self.flights = SingleFlight() if settings.cache.SINGLEFLIGHT_ENABLED else None
+        self.policy = AdaptivePolicy()
 
-    async def process_task(self, task_text: str) -> str:
-        variants = await self.generator.generate_content(task_text)
+    async def process_task(
+        self,
+        task_text: str,
+        on_progress: Optional[ProgressCallback] = None,
+        user_id: Optional[int] = None,
+        on_similar: Optional[ProgressCallback] = None,
+    ) -> str:
+        """Лучший ответ на задание. Итог каждого задания, в том числе
+        неудачного, попадает в журнал заданий.
 
-        best_variant = await self.evaluator.evaluate_content(variants)
+        on_similar получает ответ на похожее прошлое задание, если индекс
+        похожих работает в режиме offer."""
+        started = time.perf_counter()
+        entry = {"telegram_id": user_id, "topic": task_text, "variants": [], "winner": None, "model": None, "level": None}
+        try:
+            answer = await self._process(task_text, on_progress, entry, on_similar)
+        except asyncio.CancelledError:
+            entry.update(answer=None, status="cancelled")
+            raise
+        except Exception:
+            entry.update(answer=None, status="error")
+            raise
+        else:
+            entry.update(answer=answer, status="ok")
+            return answer
+        finally:
+            entry.setdefault("source", "generated")
+            entry["latency_ms"] = int((time.perf_counter() - started) * 1000)
+            # Копия: если задание отменили, а его ждут другие, вычисление
+            # продолжает заполнять entry уже после записи в журнал.
+            task_log.put(dict(entry))
+
+    async def _process(
+        self,
+        task_text: str,
+        on_progress: Optional[ProgressCallback],
+        entry: dict,
+        on_similar: Optional[ProgressCallback] = None,
+    ) -> str:
+        if self.cache is not None:
+            cached = await self.cache.get(task_text)
+            if cached is not None:
+                entry["source"] = "cache"
+                return cached
+
+        if self.dedup is not None:
+            similar = await self.dedup.find(task_text)
+            # Чужой ответ не попадает в точный кеш: иначе ошибка сходства
+            # закрепилась бы за этой темой на CACHE_TTL.
+            if similar is not None and settings.cache.DEDUP_MODE == "reuse":
+                entry["source"] = "dedup"
+                return similar
+            if similar is not None and on_similar is not None:
+                try:
+                    await on_similar(similar)
+                except Exception as e:
+                    logger.warning(f"Не удалось предложить ответ на похожее задание: {e}")
+
+        if self.flights is None:
+            return await self._generate(task_text, on_progress, entry)
+        # Если такое же задание уже выполняется, ответ берётся у него.
+        entry["source"] = "coalesced"
+        return await self.flights.do(
+            task_text,
+            lambda progress: self._generate(task_text, progress, entry),
+            on_progress,
+        )
+
+    async def _generate(self, task_text: str, on_progress: Optional[ProgressCallback], entry: dict) -> str:
+        entry["source"] = "generated"
+        self.policy.in_flight += 1
+        try:
+            plan = await self.policy.plan()
+            entry.update(model=plan.model, level=LEVEL_NAMES[plan.level])
+            ctx = TaskContext(task_text, model=plan.model)
+
+            variants = await self.generator.generate_content(ctx, on_progress, count=plan.candidates)
+            entry["variants"] = variants
+
+            best_variant = await self.evaluator.evaluate_content(ctx, variants, use_model=plan.evaluate)
+            entry["winner"] = variants.index(best_variant)
+        finally:
+            self.policy.in_flight -= 1
+
+        # Ответ, полученный в режиме экономии, не кешируется, чтобы после
+        # спада нагрузки тема получила ответ полного качества.
+        if plan.level < 2:
+            if self.cache is not None:
+                await self.cache.set(task_text, best_variant)
+            if self.dedup is not None:
+                await self.dedup.add(task_text, best_variant)
 
         return best_variant
 
-super_visor = Supervisor()
\ No newline at end of file
+def llm_calls_per_task() -> int:
+    """Сколько запросов к OpenAI может сделать одно задание без повторов."""
+    agents = settings.agents
+    count = agents.CANDIDATE_COUNT
+    generation = 1 if agents.GENERATION_MODE == "batched" else count
+    if count == 1:
+        evaluation = 0
+    else:
+        evaluation = count - 1 if EvaluatorAgent.use_tournament(count) else 1
+    return generation + evaluation
+
+
+@lru_cache()
+def get_supervisor() -> Supervisor:
+    """Supervisor создаётся при первом задании, а не при импорте.
+    Политика учитывает очередь заданий как часть нагрузки."""
+    # jobs.worker сам импортирует этот модуль.
+    from jobs import job_queue
+    supervisor = Supervisor()
+    supervisor.policy.backlog = job_queue.size
+    return supervisor
@@ -0,0 +1,156 @@
+"""Нагрузочный прогон бота без сети.
+
+Запуск из app/src:
+
+    python -m bench --scenario baseline --scenario burst --output bench.json
+
+По умолчанию используется SQLite во временном файле и не используется
+Redis: кеш результатов, индекс похожих заданий и FSM в Redis выключены.
+С --redis они включаются, с --database-url можно указать Postgres.
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+from loguru import logger
+from .fake_openai import FakeOpenAI
+from .fake_telegram import FakeTelegram
+from .scenarios import SCENARIOS
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Нагрузочный прогон бота без сети.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Сценарий; можно указать несколько раз. По умолчанию все.")
+    parser.add_argument("--users", type=int, help="Переопределяет число пользователей в сценариях.")
+    parser.add_argument("--messages", type=int, help="Переопределяет число заданий на пользователя.")
+    parser.add_argument("--latency", type=float, help="Задержка до первого токена, с.")
+    parser.add_argument("--token-rate", type=float, help="Скорость генерации, токенов в секунду.")
+    parser.add_argument("--completion-tokens", type=int, help="Длина ответа генератора в токенах.")
+    parser.add_argument("--error-rate", type=float, help="Доля ответов OpenAI с ошибкой 500.")
+    parser.add_argument("--database-url", help="URL базы; по умолчанию SQLite во временном файле.")
+    parser.add_argument("--redis", help="URL Redis; без него кеши в Redis выключены.")
+    parser.add_argument("--workers", type=int, help="Число воркеров очереди заданий.")
+    parser.add_argument("--output", default="bench-results.json", help="Файл с результатами в JSON.")
+    parser.add_argument("--log-level", default="ERROR")
+    return parser.parse_args()
+
+
+def configure_environment(args: argparse.Namespace, openai_url: str, telegram_url: str, database_url: str) -> None:
+    """Настройки бота читаются при импорте, поэтому окружение задаётся
+    до импорта модулей приложения."""
+    os.environ.update({
+        "BOT_TOKEN": "123456:bench",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": openai_url,
+        "TELEGRAM_API_URL": telegram_url,
+        "DATABASE_URL": database_url,
+        "JOB_BACKEND": "memory",
+        "METRICS_ENABLED": "false",
+        # Прогон измеряет пропускную способность, лимиты бы её срезали.
+        "RATE_LIMIT_ENABLED": "false",
+        "LOG_LEVEL": args.log_level,
+    })
+    for name in ("POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_HOST", "POSTGRES_DB"):
+        os.environ.setdefault(name, "bench")
+    os.environ.setdefault("POSTGRES_PORT", "5432")
+
+    if args.redis:
+        os.environ["REDIS"] = args.redis
+    else:
+        # Пользователи тогда ищутся только в локальном множестве процесса:
+        # обращения к недоступному Redis обрабатываются как при его сбое.
+        os.environ.update({
+            "REDIS": "redis://127.0.0.1:1/0",
+            "FSM_STORAGE": "memory",
+            "CACHE_ENABLED": "false",
+            "DEDUP_ENABLED": "false",
+            "SINGLEFLIGHT_DISTRIBUTED": "false",
+        })
+    if args.workers:
+        os.environ["JOB_WORKERS"] = str(args.workers)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args: argparse.Namespace) -> dict:
+    fake_openai = FakeOpenAI()
+    fake_telegram = FakeTelegram()
+    openai_url = await fake_openai.start()
+    telegram_url = await fake_telegram.start()
+
+    database_url = args.database_url
+    if database_url is None:
+        database_file = Path(tempfile.mkdtemp(prefix="ttc-bench-")) / "bench.db"
+        database_url = f"sqlite+aiosqlite:///{database_file}"
+    configure_environment(args, openai_url, telegram_url, database_url)
+
+    from .runner import run_scenarios
+
+    overrides = {
+        field: value
+        for field, value in {
+            "users": args.users,
+            "messages": args.messages,
+            "latency": args.latency,
+            "token_rate": args.token_rate,
+            "completion_tokens": args.completion_tokens,
+            "error_rate": args.error_rate,
+        }.items()
+        if value is not None
+    }
+    scenarios = [
+        dataclasses.replace(SCENARIOS[name], **overrides)
+        for name in args.scenario or SCENARIOS
+    ]
+
+    try:
+        results = await run_scenarios(scenarios, fake_openai, fake_telegram)
+    finally:
+        await fake_openai.stop()
+        await fake_telegram.stop()
+
+    from config import settings
+    return {
+        "revision": git_revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "database": database_url.split("://")[0],
+        "redis": bool(args.redis),
+        "generation_mode": settings.agents.GENERATION_MODE,
+        "candidate_count": settings.agents.CANDIDATE_COUNT,
+        "job_workers": settings.jobs.JOB_WORKERS,
+        "scenarios": results,
+    }
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    report = asyncio.run(main(args))
+    Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    for result in report["scenarios"]:
+        latency = result["latency"]
+        p50 = f"{latency['p50']:.2f}" if latency["p50"] is not None else "-"
+        p95 = f"{latency['p95']:.2f}" if latency["p95"] is not None else "-"
+        print(
+            f"{result['scenario']:>16}: {result['throughput']:6.2f} заданий/с, "
+            f"p50 {p50} с, p95 {p95} с, ошибок {result['failed']}, отклонено {result['rejected']}, "
+            f"LLM {result['openai_server']['requests']}, БД {sum(result['dao_calls'].values())}"
+        )
+    print(f"Результаты записаны в {args.output}")
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import random
+import re
+import time
+from aiohttp import web
+
+WORDS = (
+    "система данные модель текст анализ результат задача процесс решение "
+    "пример метод вопрос проект время работа развитие качество пользователь"
+).split()
+
+
+class FakeOpenAI:
+    """Локальный сервер, совместимый с /v1/chat/completions.
+
+    latency — задержка до первого токена, token_rate — токенов в секунду,
+    completion_tokens — длина ответа генератора, error_rate — доля
+    ответов 500. Запрос оценщика распознаётся по системному промпту
+    и получает номер варианта.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        token_rate: float = 200.0,
+        completion_tokens: int = 200,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.app = web.Application()
+        self.app.router.add_post("/v1/chat/completions", self.completions)
+        self.runner = None
+        self.url = ""
+        self.reset()
+
+    def reset(self) -> None:
+        self.requests = 0
+        self.streamed = 0
+        self.errors = 0
+        self.choices = 0
+        self.prompt_tokens = 0
+        self.completion_tokens_sent = 0
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "streamed": self.streamed,
+            "errors": self.errors,
+            "choices": self.choices,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens_sent,
+        }
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}/v1"
+        return self.url
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    def _answer(self, messages: list[dict]) -> list[str]:
+        system = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+        match = re.search(r"от 1 до (\d+)", system)
+        if match:
+            return [str(self.random.randint(1, int(match.group(1))))]
+        return [self.random.choice(WORDS) for _ in range(self.completion_tokens)]
+
+    async def completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.requests += 1
+        n = body.get("n") or 1
+        messages = body.get("messages", [])
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 3
+        self.prompt_tokens += prompt_tokens
+
+        await asyncio.sleep(self.latency)
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"error": {"message": "fake error", "type": "server_error"}}, status=500)
+
+        answers = [self._answer(messages) for _ in range(n)]
+        self.choices += n
+        completion_tokens = sum(len(tokens) for tokens in answers)
+        self.completion_tokens_sent += completion_tokens
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        base = {"id": f"chatcmpl-{self.requests}", "created": int(time.time()), "model": body.get("model", "fake")}
+
+        if not body.get("stream"):
+            await asyncio.sleep(max(len(tokens) for tokens in answers) / self.token_rate)
+            return web.json_response({
+                **base,
+                "object": "chat.completion",
+                "choices": [
+                    {
+                        "index": i,
+                        "message": {"role": "assistant", "content": " ".join(tokens)},
+                        "finish_reason": "stop",
+                    }
+                    for i, tokens in enumerate(answers)
+                ],
+                "usage": usage,
+            })
+
+        self.streamed += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(chunk: dict) -> None:
+            payload = {**base, "object": "chat.completion.chunk", **chunk}
+            await response.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode())
+
+        # Токены всех вариантов идут вперемешку, как у настоящего API с n > 1;
+        # куски по ~20 мс, чтобы не упираться в точность таймера.
+        step = max(int(self.token_rate / 50), 1)
+        for start in range(0, max(len(tokens) for tokens in answers), step):
+            choices = [
+                {
+                    "index": i,
+                    "delta": {"content": ("" if start == 0 else " ") + " ".join(tokens[start:start + step])},
+                    "finish_reason": None,
+                }
+                for i, tokens in enumerate(answers)
+                if start < len(tokens)
+            ]
+            await send({"choices": choices})
+            await asyncio.sleep(step / self.token_rate)
+        await send({"choices": [
+            {"index": i, "delta": {}, "finish_reason": "stop"} for i in range(n)
+        ]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await send({"choices": [], "usage": usage})
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
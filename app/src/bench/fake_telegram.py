@@ -0,0 +1,64 @@
+import time
+from collections import Counter, defaultdict
+from aiohttp import web
+
+
+class FakeTelegram:
+    """Локальный Bot API: принимает вызовы бота, запоминает последний
+    текст в каждом чате и считает вызовы по методам."""
+
+    def __init__(self):
+        self.app = web.Application()
+        self.app.router.add_post("/bot{token}/{method}", self.handle)
+        self.runner = None
+        self.url = ""
+        self.reset()
+
+    def reset(self) -> None:
+        self.calls: Counter = Counter()
+        self.last_text: dict[int, str] = {}
+        self._message_ids: defaultdict[int, int] = defaultdict(int)
+
+    def stats(self) -> dict:
+        return dict(self.calls)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    def _message(self, chat_id: int, message_id: int, text: str) -> dict:
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": text,
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        data = await request.post()
+        self.calls[method] += 1
+
+        if method == "getme":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method == "sendmessage":
+            chat_id = int(data["chat_id"])
+            self._message_ids[chat_id] += 1
+            self.last_text[chat_id] = data["text"]
+            result = self._message(chat_id, self._message_ids[chat_id], data["text"])
+        elif method == "editmessagetext":
+            chat_id = int(data["chat_id"])
+            self.last_text[chat_id] = data["text"]
+            result = self._message(chat_id, int(data["message_id"]), data["text"])
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
@@ -0,0 +1,257 @@
+import asyncio
+import itertools
+import math
+import random
+import time
+from typing import Optional
+from aiogram import Bot
+from aiogram.types import Update
+from loguru import logger
+from config import settings
+from clients import clients
+from constants import router_list, message_middleware_list
+from dao import Base, engine, pool_status
+from fsm_storage import create_dispatcher
+from jobs import Job, WorkerPool, job_queue
+from metrics import (
+    HandlerMetricsMiddleware,
+    DAO_LATENCY,
+    LLM_LATENCY,
+    LLM_RETRIES,
+    LLM_HEDGES,
+    EVALUATIONS,
+    ADAPTIVE_DECISIONS,
+    SINGLEFLIGHT,
+    JOB_REJECTED,
+)
+from users import known_users, registration_queue
+from tasks import task_log
+from agents.supervisor import get_supervisor
+from .fake_openai import FakeOpenAI, WORDS
+from .fake_telegram import FakeTelegram
+from .scenarios import Scenario
+
+# Фрагмент ответа обработчика, когда очередь заданий переполнена.
+REJECTED_TEXT = "слишком много заданий"
+
+
+class BenchWorkerPool(WorkerPool):
+    """WorkerPool, который сообщает о завершении задания его чату."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiters: dict[int, asyncio.Future] = {}
+
+    def expect(self, chat_id: int) -> asyncio.Future:
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters[chat_id] = waiter
+        return waiter
+
+    def _resolve(self, chat_id: int, ok: bool) -> None:
+        waiter = self.waiters.pop(chat_id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(ok)
+
+    async def process(self, job: Job) -> None:
+        await super().process(job)
+        self._resolve(job.chat_id, True)
+
+    async def _report_failure(self, job: Job) -> None:
+        await super()._report_failure(job)
+        self._resolve(job.chat_id, False)
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    """Перцентиль методом ближайшего ранга."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+def _counts(metric) -> dict[str, float]:
+    counts = {}
+    for key, value in metric._values.items():
+        # У гистограммы значение — [корзины, сумма, количество].
+        counts[".".join(key) or "total"] = value[2] if isinstance(value, list) else value
+    return counts
+
+
+def snapshot() -> dict:
+    return {
+        "dao_calls": _counts(DAO_LATENCY),
+        "llm_calls": _counts(LLM_LATENCY),
+        "llm_retries": _counts(LLM_RETRIES),
+        "llm_hedges": _counts(LLM_HEDGES),
+        "evaluations": _counts(EVALUATIONS),
+        "adaptive_decisions": _counts(ADAPTIVE_DECISIONS),
+        "singleflight": _counts(SINGLEFLIGHT),
+        "jobs_rejected": _counts(JOB_REJECTED),
+        "db_checkouts": {"total": pool_status()["checkouts"]},
+    }
+
+
+def delta(before: dict, after: dict) -> dict:
+    return {
+        name: {
+            key: value - before[name].get(key, 0)
+            for key, value in values.items()
+            if value != before[name].get(key, 0)
+        }
+        for name, values in after.items()
+    }
+
+
+def make_update(update_id: int, user_id: int, text: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {
+                "id": user_id,
+                "is_bot": False,
+                "first_name": f"user{user_id}",
+                "username": f"user{user_id}",
+            },
+            "text": text,
+        },
+    })
+
+
+class BenchRunner:
+    """Прогоняет сценарии через настоящие Dispatcher, router, UserFilter
+    и Supervisor; OpenAI и Telegram заменены локальными серверами."""
+
+    def __init__(self, fake_openai: FakeOpenAI, fake_telegram: FakeTelegram):
+        self.fake_openai = fake_openai
+        self.fake_telegram = fake_telegram
+        self.bot: Bot = clients.bot()
+        self.dp = create_dispatcher()
+        self.dp.include_routers(*router_list)
+        self.dp.message.middleware(HandlerMetricsMiddleware())
+        for middleware in message_middleware_list:
+            self.dp.message.middleware(middleware)
+        self.workers = BenchWorkerPool(job_queue, self.bot)
+        self._update_ids = itertools.count(1)
+        self._user_ids = itertools.count(1_000_000)
+
+    async def start(self) -> None:
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        await known_users.warm()
+        registration_queue.start()
+        task_log.start()
+        self.workers.start()
+
+    async def stop(self) -> None:
+        await self.workers.stop()
+        await registration_queue.stop()
+        await task_log.stop()
+        await self.dp.fsm.storage.close()
+        await clients.close()
+        await engine.dispose()
+
+    def _topic(self, scenario: Scenario, user_id: int, number: int, rng: random.Random) -> str:
+        if scenario.distinct_topics:
+            index = rng.randrange(scenario.distinct_topics)
+        else:
+            index = f"{user_id}-{number}"
+        if scenario.identical:
+            rng = random.Random(str(index))
+        return f"Тема {index}: {' '.join(rng.sample(WORDS, 5))}"
+
+    async def run(self, scenario: Scenario) -> dict:
+        self.fake_openai.latency = scenario.latency
+        self.fake_openai.token_rate = scenario.token_rate
+        self.fake_openai.completion_tokens = scenario.completion_tokens
+        self.fake_openai.error_rate = scenario.error_rate
+        self.fake_openai.reset()
+        self.fake_telegram.reset()
+        # Сценарии не должны наследовать уровень деградации предыдущего.
+        get_supervisor().policy.level = 0
+
+        overridden = {name: getattr(settings.agents, name) for name in scenario.settings}
+        for name, value in scenario.settings.items():
+            setattr(settings.agents, name, value)
+
+        latencies: list[float] = []
+        outcome = {"completed": 0, "failed": 0, "rejected": 0}
+        rng = random.Random(scenario.name)
+
+        async def simulate_user(user_id: int) -> None:
+            for number in range(scenario.messages):
+                await self.dp.feed_update(self.bot, make_update(next(self._update_ids), user_id, "/start"))
+                waiter = self.workers.expect(user_id)
+                start = time.perf_counter()
+                text = self._topic(scenario, user_id, number, rng)
+                await self.dp.feed_update(self.bot, make_update(next(self._update_ids), user_id, text))
+                if REJECTED_TEXT in self.fake_telegram.last_text.get(user_id, ""):
+                    self.workers.waiters.pop(user_id, None)
+                    outcome["rejected"] += 1
+                    continue
+                if await waiter:
+                    latencies.append(time.perf_counter() - start)
+                    outcome["completed"] += 1
+                else:
+                    outcome["failed"] += 1
+
+        before = snapshot()
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(
+                simulate_user(next(self._user_ids)) for _ in range(scenario.users)
+            ))
+            await registration_queue.flush()
+            await task_log.flush()
+        finally:
+            for name, value in overridden.items():
+                setattr(settings.agents, name, value)
+        elapsed = time.perf_counter() - started
+
+        result = {
+            "scenario": scenario.name,
+            "users": scenario.users,
+            "messages": scenario.messages,
+            "distinct_topics": scenario.distinct_topics,
+            "fake_llm": {
+                "latency": scenario.latency,
+                "token_rate": scenario.token_rate,
+                "completion_tokens": scenario.completion_tokens,
+                "error_rate": scenario.error_rate,
+            },
+            "settings": scenario.settings,
+            "elapsed": elapsed,
+            "throughput": outcome["completed"] / elapsed if elapsed else 0.0,
+            **outcome,
+            "latency": {
+                "mean": sum(latencies) / len(latencies) if latencies else None,
+                "p50": percentile(latencies, 50),
+                "p90": percentile(latencies, 90),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "max": max(latencies, default=None),
+            },
+            "openai_server": self.fake_openai.stats(),
+            "telegram_calls": self.fake_telegram.stats(),
+            **delta(before, snapshot()),
+        }
+        logger.info(
+            f"{scenario.name}: {outcome['completed']} заданий за {elapsed:.2f} с, "
+            f"p95 {result['latency']['p95']}"
+        )
+        return result
+
+
+async def run_scenarios(
+    scenarios: list[Scenario],
+    fake_openai: FakeOpenAI,
+    fake_telegram: FakeTelegram,
+) -> list[dict]:
+    runner = BenchRunner(fake_openai, fake_telegram)
+    await runner.start()
+    try:
+        return [await runner.run(scenario) for scenario in scenarios]
+    finally:
+        await runner.stop()
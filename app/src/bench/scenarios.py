@@ -0,0 +1,42 @@
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Scenario:
+    """Нагрузка и поведение фейкового OpenAI для одного прогона.
+
+    users пользователей одновременно шлют по messages заданий подряд;
+    distinct_topics ограничивает число разных тем (0 — все темы разные),
+    identical — повторы темы совпадают дословно, а не только номером,
+    settings переопределяет поля settings.agents на время прогона.
+    """
+
+    name: str
+    users: int = 10
+    messages: int = 3
+    latency: float = 0.2
+    token_rate: float = 200.0
+    completion_tokens: int = 200
+    error_rate: float = 0.0
+    distinct_topics: int = 0
+    identical: bool = False
+    settings: dict = field(default_factory=dict)
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in [
+        Scenario("baseline"),
+        Scenario("burst", users=100, messages=1),
+        Scenario("burst_fixed", users=100, messages=1, settings={"ADAPTIVE_ENABLED": False}),
+        Scenario("slow_llm", users=20, messages=2, latency=2.0, token_rate=30.0),
+        Scenario("flaky_llm", users=20, messages=2, error_rate=0.1),
+        Scenario("repeated_topics", users=20, messages=3, distinct_topics=5),
+        Scenario("hot_topic", users=50, messages=1, distinct_topics=1, identical=True),
+        Scenario("sequential", settings={"GENERATION_MODE": "sequential"}),
+        Scenario("batched", settings={"GENERATION_MODE": "batched"}),
+        Scenario("no_streaming", settings={"STREAMING": False}),
+        Scenario("wide_single", settings={"CANDIDATE_COUNT": 8, "EVALUATION_MODE": "single"}),
+        Scenario("wide_tournament", settings={"CANDIDATE_COUNT": 8, "EVALUATION_MODE": "tournament"}),
+    ]
+}
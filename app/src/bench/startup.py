@@ -0,0 +1,94 @@
+"""Время импорта бота.
+
+Запуск из app/src:
+
+    python -m bench.startup --baseline aiogram.types --budget 1.5
+
+Импортирует main в отдельном процессе с -X importtime, печатает самые
+тяжёлые модули и завершается с кодом 1, если импорт вместе с запуском
+интерпретатора дольше бюджета. С --baseline из времени вычитается импорт
+указанного модуля: так бюджет задаётся на собственный код бота поверх
+aiogram, без которого бот не запустится, и меньше зависит от машины.
+Каждый замер делается в новом процессе, поэтому байткод уже должен
+быть скомпилирован: первый запуск после изменения кода медленнее.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Настройки читаются при импорте; для замера хватает заглушек.
+ENVIRONMENT = {
+    "BOT_TOKEN": "123456:startup",
+    "OPENAI_API_KEY": "startup",
+    "REDIS": "redis://127.0.0.1:1/0",
+    "POSTGRES_USER": "startup",
+    "POSTGRES_PASSWORD": "startup",
+    "POSTGRES_HOST": "127.0.0.1",
+    "POSTGRES_PORT": "5432",
+    "POSTGRES_DB": "startup",
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench.startup", description="Время импорта бота.")
+    parser.add_argument("--module", default="main", help="Модуль, импорт которого измеряется.")
+    parser.add_argument("--budget", type=float, help="Допустимое время импорта, с.")
+    parser.add_argument("--baseline", help="Модуль, время импорта которого вычитается перед сравнением с бюджетом.")
+    parser.add_argument("--runs", type=int, default=3, help="Число замеров; берётся лучший.")
+    parser.add_argument("--top", type=int, default=15, help="Сколько самых тяжёлых модулей показать.")
+    return parser.parse_args()
+
+
+def measure(module: str) -> tuple[float, list[tuple[int, str]]]:
+    """Время импорта в секундах и (мкс, модуль) для модулей, которые
+    импортирует сам module, с учётом их вложенных импортов."""
+    env = {**ENVIRONMENT, **os.environ}
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"Не удалось импортировать {module}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Вложенность показана отступом в два пробела после одного
+        # ведущего; нужны модули, импортированные самим module.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            modules.append((int(cumulative), name.strip()))
+    return elapsed, modules
+
+
+def main() -> int:
+    args = parse_args()
+    runs = [measure(args.module) for _ in range(max(args.runs, 1))]
+    elapsed, modules = min(runs, key=lambda run: run[0])
+
+    print(f"Импорт {args.module}: {elapsed:.2f} с (лучший из {len(runs)})")
+    for cumulative, name in sorted(modules, reverse=True)[:args.top]:
+        print(f"{cumulative / 1_000_000:8.3f} с  {name}")
+
+    if args.baseline:
+        baseline = min(measure(args.baseline)[0] for _ in range(max(args.runs, 1)))
+        elapsed = max(elapsed - baseline, 0.0)
+        print(f"Импорт {args.baseline}: {baseline:.2f} с, без него: {elapsed:.2f} с")
+
+    if args.budget is not None and elapsed > args.budget:
+        print(f"Бюджет {args.budget:.2f} с превышен")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,100 @@
+import importlib.util
+from typing import TYPE_CHECKING, Optional
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from loguru import logger
+from redis.asyncio import BlockingConnectionPool, Redis
+from config import settings
+
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI
+
+
+class ClientRegistry:
+    """Общие для процесса исходящие клиенты: OpenAI, Telegram и Redis.
+
+    Клиенты создаются при первом обращении, поэтому пул соединений
+    и TLS-сессии делят все компоненты, а процесс, которому клиент
+    не нужен, его не открывает. openai и httpx импортируются тогда же:
+    их импорт — заметная часть времени запуска. close() вызывается
+    при остановке.
+    """
+
+    def __init__(self):
+        self._openai: Optional["AsyncOpenAI"] = None
+        self._http: Optional["httpx.AsyncClient"] = None
+        self._bot: Optional[Bot] = None
+        self._redis: Optional[Redis] = None
+
+    def http(self) -> "httpx.AsyncClient":
+        if self._http is None:
+            import httpx
+
+            config = settings.clients
+            http2 = config.HTTP2 and importlib.util.find_spec("h2") is not None
+            if config.HTTP2 and not http2:
+                logger.warning("Пакет h2 не установлен, HTTP/2 отключён.")
+            self._http = httpx.AsyncClient(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=config.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+                ),
+                # Сроки вызовов задаёт call_with_deadline, здесь только
+                # защита от зависшего соединения.
+                timeout=httpx.Timeout(settings.agents.LLM_CALL_TIMEOUT, connect=10.0),
+            )
+        return self._http
+
+    def openai(self) -> "AsyncOpenAI":
+        if self._openai is None:
+            from openai import AsyncOpenAI
+
+            # Повторы выполняет call_with_deadline с учётом срока задания.
+            self._openai = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.clients.OPENAI_BASE_URL or None,
+                max_retries=0,
+                http_client=self.http(),
+            )
+        return self._openai
+
+    def bot(self) -> Bot:
+        if self._bot is None:
+            config = settings.clients
+            api = TelegramAPIServer.from_base(config.TELEGRAM_API_URL) if config.TELEGRAM_API_URL else PRODUCTION
+            self._bot = Bot(
+                token=settings.BOT_TOKEN,
+                session=AiohttpSession(api=api, limit=config.BOT_CONNECTION_LIMIT),
+            )
+        return self._bot
+
+    def redis(self) -> Redis:
+        if self._redis is None:
+            # Блокирующий пул ждёт свободное соединение, а не падает
+            # с ошибкой, когда все заняты.
+            pool = BlockingConnectionPool.from_url(
+                settings.REDIS,
+                max_connections=settings.clients.REDIS_MAX_CONNECTIONS,
+            )
+            self._redis = Redis(connection_pool=pool)
+        return self._redis
+
+    async def close(self) -> None:
+        if self._openai is not None:
+            await self._openai.close()
+            self._openai = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._bot is not None:
+            await self._bot.session.close()
+        if self._redis is not None:
+            await self._redis.aclose(close_connection_pool=True)
+            self._redis = None
+
+
+clients = ClientRegistry()
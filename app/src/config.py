@@ -8,6 +8,24 @@ class DatabaseSettings(BaseSettings):
     POSTGRES_HOST: str
     POSTGRES_PORT: int
     POSTGRES_DB: str
+    DATABASE_URL: str = ""
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 256
+    DB_STATEMENT_TIMEOUT_MS: int = 15000
+    DB_COMMAND_TIMEOUT: float = 30.0
+    REGISTRATION_FLUSH_INTERVAL: float = 1.0
+    REGISTRATION_BATCH_SIZE: int = 500
+    TASK_LOG_ENABLED: bool = True
+    TASK_LOG_FLUSH_INTERVAL: float = 2.0
+    TASK_LOG_BATCH_SIZE: int = 1000
+    # Сколько раз повторять запись, которую не удалось загрузить
+    # (при интервале 2 с — около пяти минут недоступности базы).
+    TASK_LOG_MAX_RETRIES: int = 150
 
     model_config = SettingsConfigDict(
         env_file=str(Path(__file__).parent.parent / '.env'),
@@ -15,12 +33,175 @@ class DatabaseSettings(BaseSettings):
         extra='ignore'
     )
 
-    
+
+class AgentSettings(BaseSettings):
+    OPENAI_MODEL: str = "gpt-4o"
+    PROMPT_VERSION: str = "1"
+    GENERATION_MODE: str = "concurrent"
+    CANDIDATE_COUNT: int = 3
+    TASK_DEADLINE: float = 90.0
+    LLM_CALL_TIMEOUT: float = 45.0
+    LLM_RETRIES: int = 2
+    LLM_RETRY_BASE_DELAY: float = 0.5
+    HEDGE_DELAY: float = 0.0
+    PRESCORE_ENABLED: bool = True
+    PRESCORE_MARGIN: float = 0.25
+    EVALUATION_MODE: str = "auto"
+    TOURNAMENT_GROUP_SIZE: int = 2
+    TOURNAMENT_MIN_CANDIDATES: int = 5
+    ADAPTIVE_ENABLED: bool = True
+    FALLBACK_MODEL: str = "gpt-4o-mini"
+    ADAPTIVE_REDUCED_CANDIDATES: int = 2
+    ADAPTIVE_LOAD_LEVELS: list[float] = [1.5, 3.0, 6.0]
+    ADAPTIVE_SLOW_LATENCY: float = 30.0
+    ADAPTIVE_ERROR_RATE: float = 0.3
+    ADAPTIVE_WINDOW: float = 60.0
+    ADAPTIVE_COOLDOWN: float = 15.0
+    CONTEXT_TOKEN_BUDGET: int = 6000
+    MAX_INPUT_TOKENS: int = 1000
+    STREAMING: bool = True
+    STREAM_EDIT_INTERVAL: float = 1.0
+
+    model_config = SettingsConfigDict(
+        env_file=str(Path(__file__).parent.parent / '.env'),
+        env_prefix='',
+        extra='ignore'
+    )
+
+
+class CacheSettings(BaseSettings):
+    CACHE_ENABLED: bool = True
+    CACHE_L1_SIZE: int = 1024
+    CACHE_L1_TTL: int = 600
+    CACHE_TTL: int = 86400
+    # Похожими по шинглам оказываются и задания с разным смыслом
+    # («скидка 20%» и «скидка 50%»), поэтому индекс выключен по умолчанию,
+    # а найденный ответ только предлагается пользователю (offer), пока
+    # генерируется свой. reuse возвращает найденный ответ вместо генерации.
+    DEDUP_ENABLED: bool = False
+    DEDUP_THRESHOLD: float = 0.95
+    DEDUP_MODE: str = "offer"
+    SINGLEFLIGHT_ENABLED: bool = True
+    # Объединять одинаковые задания между репликами через Redis.
+    SINGLEFLIGHT_DISTRIBUTED: bool = True
+    SINGLEFLIGHT_LOCK_TTL: float = 30.0
+    SINGLEFLIGHT_RESULT_TTL: int = 60
+    SINGLEFLIGHT_POLL_INTERVAL: float = 0.5
+
+    model_config = SettingsConfigDict(
+        env_file=str(Path(__file__).parent.parent / '.env'),
+        env_prefix='',
+        extra='ignore'
+    )
+
+
+class MetricsSettings(BaseSettings):
+    METRICS_ENABLED: bool = True
+    METRICS_HOST: str = "0.0.0.0"
+    METRICS_PORT: int = 9100
+    # /health и /ready на порту метрик; работают и при выключенных метриках.
+    PROBES_ENABLED: bool = True
+    # Сколько секунд от запуска процесса до готовности считать нормой:
+    # дольше — пишется предупреждение. Большая часть этого времени —
+    # импорт aiogram, на медленной машине он один занимает 3.5–4 с.
+    STARTUP_BUDGET: float = 6.0
+
+    model_config = SettingsConfigDict(
+        env_file=str(Path(__file__).parent.parent / '.env'),
+        env_prefix='',
+        extra='ignore'
+    )
+
+
+class JobSettings(BaseSettings):
+    JOB_BACKEND: str = "memory"
+    JOB_WORKERS: int = 4
+    JOB_QUEUE_MAX_SIZE: int = 100
+    JOB_NOTIFY_POSITION: bool = True
+    # Сколько ждать выполняющиеся задания при остановке; остальные
+    # возвращаются в общую очередь, а без неё пользователь получает сообщение.
+    JOB_DRAIN_TIMEOUT: float = 20.0
+
+    model_config = SettingsConfigDict(
+        env_file=str(Path(__file__).parent.parent / '.env'),
+        env_prefix='',
+        extra='ignore'
+    )
+
+
+class WebhookSettings(BaseSettings):
+    BOT_MODE: str = "polling"
+    WEBHOOK_BASE_URL: str = ""
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_SECRET: str = ""
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    WEB_WORKERS: int = 1
+
+    model_config = SettingsConfigDict(
+        env_file=str(Path(__file__).parent.parent / '.env'),
+        env_prefix='',
+        extra='ignore'
+    )
+
+
+class FSMSettings(BaseSettings):
+    FSM_STORAGE: str = "redis"
+    FSM_CACHE_TTL: float = 2.0
+    FSM_STATE_TTL: int = 0
+
+    model_config = SettingsConfigDict(
+        env_file=str(Path(__file__).parent.parent / '.env'),
+        env_prefix='',
+        extra='ignore'
+    )
+
+
+class RateLimitSettings(BaseSettings):
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_USER_PER_MINUTE: float = 6.0
+    RATE_LIMIT_USER_BURST: int = 3
+    RATE_LIMIT_GLOBAL_CALLS_PER_MINUTE: float = 500.0
+    RATE_LIMIT_GLOBAL_BURST: int = 50
+
+    model_config = SettingsConfigDict(
+        env_file=str(Path(__file__).parent.parent / '.env'),
+        env_prefix='',
+        extra='ignore'
+    )
+
+
+class ClientSettings(BaseSettings):
+    OPENAI_BASE_URL: str = ""
+    TELEGRAM_API_URL: str = ""
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP2: bool = True
+    BOT_CONNECTION_LIMIT: int = 100
+    REDIS_MAX_CONNECTIONS: int = 50
+
+    model_config = SettingsConfigDict(
+        env_file=str(Path(__file__).parent.parent / '.env'),
+        env_prefix='',
+        extra='ignore'
+    )
+
+
 class Settings(BaseSettings):
     BOT_TOKEN: str
     REDIS: str
     OPENAI_API_KEY: str
+    LOG_LEVEL: str = "INFO"
     db: DatabaseSettings = DatabaseSettings()
+    agents: AgentSettings = AgentSettings()
+    cache: CacheSettings = CacheSettings()
+    metrics: MetricsSettings = MetricsSettings()
+    jobs: JobSettings = JobSettings()
+    webhook: WebhookSettings = WebhookSettings()
+    fsm: FSMSettings = FSMSettings()
+    clients: ClientSettings = ClientSettings()
+    ratelimit: RateLimitSettings = RateLimitSettings()
 
     model_config = SettingsConfigDict(
         env_file=str(Path(__file__).parent.parent / '.env'),
@@ -31,6 +212,14 @@ class Settings(BaseSettings):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.db = DatabaseSettings()
+        self.agents = AgentSettings()
+        self.cache = CacheSettings()
+        self.metrics = MetricsSettings()
+        self.jobs = JobSettings()
+        self.webhook = WebhookSettings()
+        self.fsm = FSMSettings()
+        self.clients = ClientSettings()
+        self.ratelimit = RateLimitSettings()
     
 @lru_cache()
 def get_settings() -> Settings:
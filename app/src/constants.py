@@ -1,5 +1,10 @@
 from users.router import router as users_router
+from middlewares import RateLimitMiddleware
 
 router_list = [
     users_router,
-]
\ No newline at end of file
+]
+
+message_middleware_list = [
+    RateLimitMiddleware(),
+]
@@ -1,3 +1,3 @@
-from .database import Base, get_session, engine, AsyncSessionLocal
+from .database import Base, get_session, engine, AsyncSessionLocal, pool_status
 from .base import BaseModel
 from .dao import BaseDAO
\ No newline at end of file
@@ -1,11 +1,20 @@
-from typing import List, Any, TypeVar, Generic, Optional, Dict
+from typing import List, Any, TypeVar, Generic, Optional, Dict, AsyncIterator, Tuple
+import base64
+import datetime
+import functools
+import json
+import time
+from contextvars import ContextVar
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.future import select
-from sqlalchemy import update as sqlalchemy_update, delete as sqlalchemy_delete, func
+from sqlalchemy import update as sqlalchemy_update, delete as sqlalchemy_delete, func, tuple_, insert, JSON
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from dao import BaseModel as Base, get_session
+from metrics import DAO_LATENCY, DAO_ERRORS, DAO_IN_FLIGHT
 
 T = TypeVar("T", bound=Base)
 
@@ -13,81 +22,133 @@ def remove_none_values(data: Dict) -> Dict:
     """Возвращает копию словаря без значений None."""
     return {k: v for k, v in data.items() if v is not None}
 
+_dao_call_active: ContextVar[bool] = ContextVar("dao_call_active", default=False)
+
+def observed(method):
+    """Снимает метрики вызова метода DAO. Повторный вызов того же метода
+    с открытой сессией (session=None -> get_session) не учитывается дважды."""
+    @functools.wraps(method)
+    async def wrapper(cls, *args, **kwargs):
+        if _dao_call_active.get():
+            return await method(cls, *args, **kwargs)
+
+        token = _dao_call_active.set(True)
+        model = cls.model.__name__
+        start = time.perf_counter()
+        DAO_IN_FLIGHT.inc(model=model)
+        try:
+            return await method(cls, *args, **kwargs)
+        except Exception:
+            DAO_ERRORS.inc(model=model, method=method.__name__)
+            raise
+        finally:
+            DAO_IN_FLIGHT.dec(model=model)
+            DAO_LATENCY.observe(time.perf_counter() - start, model=model, method=method.__name__)
+            _dao_call_active.reset(token)
+    return wrapper
+
+def encode_cursor(value: Any, record_id: int) -> str:
+    """Упаковывает позицию последней записи страницы в непрозрачную строку."""
+    if isinstance(value, datetime.datetime):
+        value = {"dt": value.isoformat()}
+    raw = json.dumps({"v": value, "id": record_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        value = data["v"]
+        if isinstance(value, dict):
+            value = datetime.datetime.fromisoformat(value["dt"])
+        return value, int(data["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Некорректный курсор пагинации: {cursor}") from e
+
+def _dialect_insert(session: AsyncSession):
+    """insert() с поддержкой ON CONFLICT для диалекта текущей сессии."""
+    if session.bind.dialect.name == "sqlite":
+        return sqlite_insert
+    return pg_insert
+
 class BaseDAO(Generic[T]):
     model: type[T]
 
     @classmethod
+    @observed
     async def find_one_or_none_by_id(cls, data_id: int, session: Optional[AsyncSession] = None) -> Optional[T]:
         if session is None:
             async with get_session() as session:
                 return await cls.find_one_or_none_by_id(data_id, session=session)
 
-        logger.info(f"Поиск {cls.model.__name__} с ID: {data_id}")
+        logger.debug("Поиск {} с ID: {}", cls.model.__name__, data_id)
         try:
             query = select(cls.model).filter_by(id=data_id)
             result = await session.execute(query)
             record = result.scalar_one_or_none()
             if record:
-                logger.info(f"Запись с ID {data_id} найдена.")
+                logger.debug("Запись с ID {} найдена.", data_id)
             else:
-                logger.info(f"Запись с ID {data_id} не найдена.")
+                logger.debug("Запись с ID {} не найдена.", data_id)
             return record
         except SQLAlchemyError as e:
             logger.error(f"Ошибка при поиске записи с ID {data_id}: {e}")
             raise
 
     @classmethod
+    @observed
     async def find_one_or_none(cls, filters: Dict, session: Optional[AsyncSession] = None) -> Optional[T]:
         if session is None:
             async with get_session() as session:
                 return await cls.find_one_or_none(filters, session=session)
 
         filter_dict = remove_none_values(filters) if filters else {}
-        logger.info(f"Поиск одной записи {cls.model.__name__} по фильтрам: {filter_dict}")
+        logger.debug("Поиск одной записи {} по фильтрам: {}", cls.model.__name__, filter_dict)
         try:
             query = select(cls.model).filter_by(**filter_dict)
             result = await session.execute(query)
             record = result.scalar_one_or_none()
             if record:
-                logger.info(f"Запись найдена по фильтрам: {filter_dict}")
+                logger.debug("Запись найдена по фильтрам: {}", filter_dict)
             else:
-                logger.info(f"Запись не найдена по фильтрам: {filter_dict}")
+                logger.debug("Запись не найдена по фильтрам: {}", filter_dict)
             return record
         except SQLAlchemyError as e:
             logger.error(f"Ошибка при поиске записи по фильтрам {filter_dict}: {e}")
             raise
 
     @classmethod
+    @observed
     async def find_all(cls, filters: Optional[Dict] = None, session: Optional[AsyncSession] = None) -> List[T]:
         if session is None:
             async with get_session() as session:
                 return await cls.find_all(filters, session=session)
 
         filter_dict = remove_none_values(filters) if filters else {}
-        logger.info(f"Поиск всех записей {cls.model.__name__} по фильтрам: {filter_dict}")
+        logger.debug("Поиск всех записей {} по фильтрам: {}", cls.model.__name__, filter_dict)
         try:
             query = select(cls.model).filter_by(**filter_dict)
             result = await session.execute(query)
             records = result.scalars().all()
-            logger.info(f"Найдено {len(records)} записей.")
+            logger.debug("Найдено {} записей.", len(records))
             return records
         except SQLAlchemyError as e:
             logger.error(f"Ошибка при поиске всех записей по фильтрам {filter_dict}: {e}")
             raise
 
     @classmethod
+    @observed
     async def add(cls, values: Dict, session: Optional[AsyncSession] = None) -> T:
         if session is None:
             async with get_session() as session:
                 return await cls.add(values, session=session)
 
         values_dict = remove_none_values(values)
-        logger.info(f"Добавление записи {cls.model.__name__} с параметрами: {values_dict}")
+        logger.debug("Добавление записи {} с параметрами: {}", cls.model.__name__, values_dict)
         new_instance = cls.model(**values_dict)
         session.add(new_instance)
         try:
             await session.flush()
-            logger.info(f"Запись {cls.model.__name__} успешно добавлена.")
+            logger.debug("Запись {} успешно добавлена.", cls.model.__name__)
         except SQLAlchemyError as e:
             await session.rollback()
             logger.error(f"Ошибка при добавлении записи: {e}")
@@ -95,17 +156,18 @@ class BaseDAO(Generic[T]):
         return new_instance
 
     @classmethod
+    @observed
     async def add_many(cls, instances: List[Dict], session: Optional[AsyncSession] = None) -> List[T]:
         if session is None:
             async with get_session() as session:
                 return await cls.add_many(instances, session=session)
 
-        logger.info(f"Добавление нескольких записей {cls.model.__name__}. Количество: {len(instances)}")
+        logger.debug("Добавление нескольких записей {}. Количество: {}", cls.model.__name__, len(instances))
         new_instances = [cls.model(**remove_none_values(item)) for item in instances]
         session.add_all(new_instances)
         try:
             await session.flush()
-            logger.info(f"Успешно добавлено {len(new_instances)} записей.")
+            logger.debug("Успешно добавлено {} записей.", len(new_instances))
         except SQLAlchemyError as e:
             await session.rollback()
             logger.error(f"Ошибка при добавлении нескольких записей: {e}")
@@ -113,6 +175,86 @@ class BaseDAO(Generic[T]):
         return new_instances
 
     @classmethod
+    @observed
+    async def add_many_ignore_conflicts(
+        cls, instances: List[Dict], conflict_fields: List[str], session: Optional[AsyncSession] = None
+    ) -> int:
+        """Вставляет записи одним INSERT ... ON CONFLICT DO NOTHING,
+        возвращает число действительно добавленных строк.
+        Все словари должны содержать одинаковый набор ключей."""
+        if session is None:
+            async with get_session() as session:
+                return await cls.add_many_ignore_conflicts(instances, conflict_fields, session=session)
+
+        if not instances:
+            return 0
+
+        logger.debug("Добавление {} записей {} с пропуском конфликтов по {}", len(instances), cls.model.__name__, conflict_fields)
+        query = (
+            _dialect_insert(session)(cls.model)
+            .values(instances)
+            .on_conflict_do_nothing(index_elements=conflict_fields)
+        )
+        try:
+            result = await session.execute(query)
+            await session.flush()
+            logger.debug("Добавлено {} записей.", result.rowcount)
+            return result.rowcount
+        except SQLAlchemyError as e:
+            await session.rollback()
+            logger.error(f"Ошибка при добавлении записей с пропуском конфликтов: {e}")
+            raise e
+
+    @classmethod
+    @observed
+    async def copy_many(cls, instances: List[Dict], session: Optional[AsyncSession] = None) -> int:
+        """Загружает записи в таблицу через COPY asyncpg, без построчных
+        INSERT и без возврата объектов. На других диалектах выполняется
+        один многострочный INSERT. Все словари должны содержать одинаковый
+        набор ключей; транзакцию завершает вызывающий."""
+        if session is None:
+            async with get_session() as session:
+                copied = await cls.copy_many(instances, session=session)
+                await session.commit()
+                return copied
+
+        if not instances:
+            return 0
+
+        logger.debug("Загрузка {} записей {} через COPY", len(instances), cls.model.__name__)
+        table = cls.model.__table__
+        columns = list(instances[0])
+        try:
+            connection = await session.connection()
+            if connection.dialect.name != "postgresql":
+                await session.execute(insert(table).values(instances))
+                return len(instances)
+
+            # COPY в двоичном формате: JSON-колонки asyncpg принимает строкой.
+            json_columns = {name for name in columns if isinstance(table.c[name].type, JSON)}
+            records = [
+                tuple(
+                    json.dumps(item[name], ensure_ascii=False) if name in json_columns else item[name]
+                    for name in columns
+                )
+                for item in instances
+            ]
+            # Адаптер asyncpg открывает транзакцию при первом запросе;
+            # без него COPY выполнился бы вне транзакции сессии.
+            await session.execute(select(1))
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                table.name, records=records, columns=columns, schema_name=table.schema
+            )
+            logger.debug("Загружено {} записей.", len(records))
+            return len(records)
+        except Exception as e:
+            await session.rollback()
+            logger.error(f"Ошибка при загрузке записей через COPY: {e}")
+            raise e
+
+    @classmethod
+    @observed
     async def update(cls, filters: Dict, values: Dict, session: Optional[AsyncSession] = None) -> int:
         if session is None:
             async with get_session() as session:
@@ -120,7 +262,7 @@ class BaseDAO(Generic[T]):
 
         filter_dict = remove_none_values(filters)
         values_dict = remove_none_values(values)
-        logger.info(f"Обновление записей {cls.model.__name__} по фильтру: {filter_dict} с параметрами: {values_dict}")
+        logger.debug("Обновление записей {} по фильтру: {} с параметрами: {}", cls.model.__name__, filter_dict, values_dict)
         query = (
             sqlalchemy_update(cls.model)
             .where(*[getattr(cls.model, k) == v for k, v in filter_dict.items()])
@@ -130,7 +272,7 @@ class BaseDAO(Generic[T]):
         try:
             result = await session.execute(query)
             await session.flush()
-            logger.info(f"Обновлено {result.rowcount} записей.")
+            logger.debug("Обновлено {} записей.", result.rowcount)
             return result.rowcount
         except SQLAlchemyError as e:
             await session.rollback()
@@ -138,13 +280,14 @@ class BaseDAO(Generic[T]):
             raise e
 
     @classmethod
+    @observed
     async def delete(cls, filters: Dict, session: Optional[AsyncSession] = None) -> int:
         if session is None:
             async with get_session() as session:
                 return await cls.delete(filters, session=session)
 
         filter_dict = remove_none_values(filters)
-        logger.info(f"Удаление записей {cls.model.__name__} по фильтру: {filter_dict}")
+        logger.debug("Удаление записей {} по фильтру: {}", cls.model.__name__, filter_dict)
         if not filter_dict:
             logger.error("Нужен хотя бы один фильтр для удаления.")
             raise ValueError("Нужен хотя бы один фильтр для удаления.")
@@ -153,7 +296,7 @@ class BaseDAO(Generic[T]):
         try:
             result = await session.execute(query)
             await session.flush()
-            logger.info(f"Удалено {result.rowcount} записей.")
+            logger.debug("Удалено {} записей.", result.rowcount)
             return result.rowcount
         except SQLAlchemyError as e:
             await session.rollback()
@@ -161,24 +304,26 @@ class BaseDAO(Generic[T]):
             raise e
 
     @classmethod
+    @observed
     async def count(cls, filters: Optional[Dict] = None, session: Optional[AsyncSession] = None) -> int:
         if session is None:
             async with get_session() as session:
                 return await cls.count(filters, session=session)
 
         filter_dict = remove_none_values(filters) if filters else {}
-        logger.info(f"Подсчет количества записей {cls.model.__name__} по фильтру: {filter_dict}")
+        logger.debug("Подсчет количества записей {} по фильтру: {}", cls.model.__name__, filter_dict)
         try:
             query = select(func.count(cls.model.id)).filter_by(**filter_dict)
             result = await session.execute(query)
             count = result.scalar()
-            logger.info(f"Найдено {count} записей.")
+            logger.debug("Найдено {} записей.", count)
             return count
         except SQLAlchemyError as e:
             logger.error(f"Ошибка при подсчете записей: {e}")
             raise
 
     @classmethod
+    @observed
     async def paginate(
         cls,
         page: int = 1,
@@ -191,90 +336,212 @@ class BaseDAO(Generic[T]):
                 return await cls.paginate(page, page_size, filters, session=session)
 
         filter_dict = remove_none_values(filters) if filters else {}
-        logger.info(
-            f"Пагинация записей {cls.model.__name__} по фильтру: {filter_dict}, страница: {page}, размер страницы: {page_size}"
+        logger.debug(
+            "Пагинация записей {} по фильтру: {}, страница: {}, размер страницы: {}",
+            cls.model.__name__, filter_dict, page, page_size,
         )
         try:
             query = select(cls.model).filter_by(**filter_dict)
             result = await session.execute(query.offset((page - 1) * page_size).limit(page_size))
             records = result.scalars().all()
-            logger.info(f"Найдено {len(records)} записей на странице {page}.")
+            logger.debug("Найдено {} записей на странице {}.", len(records), page)
             return records
         except SQLAlchemyError as e:
             logger.error(f"Ошибка при пагинации записей: {e}")
             raise
 
     @classmethod
+    @observed
+    async def paginate_keyset(
+        cls,
+        cursor: Optional[str] = None,
+        page_size: int = 10,
+        filters: Optional[Dict] = None,
+        order_by: str = "id",
+        session: Optional[AsyncSession] = None,
+    ) -> Tuple[List[T], Optional[str]]:
+        """Keyset-пагинация по id или created_at: стоимость страницы не
+        зависит от её глубины. Возвращает записи и курсор следующей
+        страницы (None, если страница последняя)."""
+        if session is None:
+            async with get_session() as session:
+                return await cls.paginate_keyset(cursor, page_size, filters, order_by, session=session)
+
+        if order_by not in ("id", "created_at"):
+            raise ValueError("Keyset-пагинация поддерживает только id и created_at.")
+
+        filter_dict = remove_none_values(filters) if filters else {}
+        logger.debug("Keyset-пагинация записей {} по фильтру: {}, курсор: {}", cls.model.__name__, filter_dict, cursor)
+        column = getattr(cls.model, order_by)
+        query = select(cls.model).filter_by(**filter_dict)
+        if cursor is not None:
+            value, record_id = decode_cursor(cursor)
+            if order_by == "id":
+                query = query.where(cls.model.id > record_id)
+            elif session.bind.dialect.name == "sqlite":
+                # SQLite хранит время строкой, и у server_default нет долей
+                # секунды, а у параметра есть: строки с одним временем
+                # сравнивались бы неверно, поэтому сравниваются моменты.
+                query = query.where(
+                    tuple_(func.julianday(column), cls.model.id) > tuple_(func.julianday(value), record_id)
+                )
+            else:
+                query = query.where(tuple_(column, cls.model.id) > tuple_(value, record_id))
+        query = query.order_by(column, cls.model.id).limit(page_size + 1)
+
+        try:
+            result = await session.execute(query)
+            records = result.scalars().all()
+        except SQLAlchemyError as e:
+            logger.error(f"Ошибка при keyset-пагинации записей: {e}")
+            raise
+
+        next_cursor = None
+        if len(records) > page_size:
+            records = records[:page_size]
+            last = records[-1]
+            next_cursor = encode_cursor(getattr(last, order_by), last.id)
+        logger.debug("Найдено {} записей на странице.", len(records))
+        return records, next_cursor
+
+    @classmethod
+    async def iter_all(
+        cls,
+        filters: Optional[Dict] = None,
+        fetch_size: int = 1000,
+        session: Optional[AsyncSession] = None,
+    ) -> AsyncIterator[T]:
+        """Перебирает записи через серверный курсор, подгружая по
+        fetch_size строк, так что память не растёт с размером таблицы."""
+        if session is None:
+            async with get_session() as session:
+                async for record in cls.iter_all(filters, fetch_size, session=session):
+                    yield record
+            return
+
+        filter_dict = remove_none_values(filters) if filters else {}
+        logger.debug("Потоковый перебор записей {} по фильтрам: {}", cls.model.__name__, filter_dict)
+        query = (
+            select(cls.model)
+            .filter_by(**filter_dict)
+            .order_by(cls.model.id)
+            .execution_options(yield_per=fetch_size)
+        )
+        try:
+            result = await session.stream_scalars(query)
+            async for record in result:
+                yield record
+        except SQLAlchemyError as e:
+            logger.error(f"Ошибка при потоковом переборе записей: {e}")
+            raise
+
+    @classmethod
+    @observed
     async def find_by_ids(cls, ids: List[int], session: Optional[AsyncSession] = None) -> List[Any]:
         if session is None:
             async with get_session() as session:
                 return await cls.find_by_ids(ids, session=session)
 
-        logger.info(f"Поиск записей {cls.model.__name__} по списку ID: {ids}")
+        logger.debug("Поиск записей {} по списку ID: {}", cls.model.__name__, ids)
         try:
             query = select(cls.model).filter(cls.model.id.in_(ids))
             result = await session.execute(query)
             records = result.scalars().all()
-            logger.info(f"Найдено {len(records)} записей по списку ID.")
+            logger.debug("Найдено {} записей по списку ID.", len(records))
             return records
         except SQLAlchemyError as e:
             logger.error(f"Ошибка при поиске записей по списку ID: {e}")
             raise
 
     @classmethod
+    @observed
     async def upsert(cls, unique_fields: List[str], values: Dict, session: Optional[AsyncSession] = None) -> T:
         if session is None:
             async with get_session() as session:
                 return await cls.upsert(unique_fields, values, session=session)
 
         values_dict = remove_none_values(values)
-        filter_dict = {field: values_dict[field] for field in unique_fields if field in values_dict}
-
-        logger.info(f"Upsert для {cls.model.__name__} с фильтром: {filter_dict}")
+        logger.debug("Upsert для {} по полям: {}", cls.model.__name__, unique_fields)
         try:
-            existing = await cls.find_one_or_none(filter_dict, session=session)
-            if existing:
-                for key, value in values_dict.items():
-                    setattr(existing, key, value)
-                await session.flush()
-                logger.info(f"Обновлена существующая запись {cls.model.__name__}")
-                return existing
-            else:
-                new_instance = cls.model(**values_dict)
-                session.add(new_instance)
-                await session.flush()
-                logger.info(f"Создана новая запись {cls.model.__name__}")
-                return new_instance
+            query = cls._upsert_query(unique_fields, [values_dict], session)
+            result = await session.scalars(query, execution_options={"populate_existing": True})
+            record = result.one()
+            await session.flush()
+            logger.debug("Upsert записи {} выполнен", cls.model.__name__)
+            return record
         except SQLAlchemyError as e:
             await session.rollback()
             logger.error(f"Ошибка при upsert: {e}")
             raise e
 
     @classmethod
+    @observed
+    async def upsert_many(
+        cls, unique_fields: List[str], records: List[Dict], session: Optional[AsyncSession] = None
+    ) -> List[T]:
+        """Upsert пачки записей одним запросом. Все словари должны
+        содержать одинаковый набор ключей."""
+        if session is None:
+            async with get_session() as session:
+                return await cls.upsert_many(unique_fields, records, session=session)
+
+        if not records:
+            return []
+
+        logger.debug("Upsert {} записей {} по полям: {}", len(records), cls.model.__name__, unique_fields)
+        try:
+            query = cls._upsert_query(unique_fields, records, session)
+            result = await session.scalars(query, execution_options={"populate_existing": True})
+            instances = result.all()
+            await session.flush()
+            logger.debug("Upsert выполнен для {} записей", len(instances))
+            return instances
+        except SQLAlchemyError as e:
+            await session.rollback()
+            logger.error(f"Ошибка при массовом upsert: {e}")
+            raise e
+
+    @classmethod
+    def _upsert_query(cls, unique_fields: List[str], records: List[Dict], session: AsyncSession):
+        """INSERT ... ON CONFLICT DO UPDATE ... RETURNING: выборка и запись
+        за один запрос, без гонки между SELECT и INSERT."""
+        query = _dialect_insert(session)(cls.model).values(records)
+        set_ = {key: query.excluded[key] for key in records[0] if key not in unique_fields}
+        if not set_:
+            # Пустой SET недопустим, а без DO UPDATE RETURNING не вернёт
+            # существующую строку, поэтому перезаписываем уникальное поле им же.
+            set_ = {unique_fields[0]: query.excluded[unique_fields[0]]}
+        if hasattr(cls.model, "updated_at"):
+            set_["updated_at"] = func.now()
+        return query.on_conflict_do_update(index_elements=unique_fields, set_=set_).returning(cls.model)
+
+    @classmethod
+    @observed
     async def bulk_update(cls, records: List[Dict], session: Optional[AsyncSession] = None) -> int:
         if session is None:
             async with get_session() as session:
                 return await cls.bulk_update(records, session=session)
 
-        logger.info(f"Массовое обновление записей {cls.model.__name__}")
-        try:
-            updated_count = 0
-            for record in records:
-                record_dict = remove_none_values(record)
-                if 'id' not in record_dict:
-                    continue
-
-                update_data = {k: v for k, v in record_dict.items() if k != 'id'}
-                stmt = (
-                    sqlalchemy_update(cls.model)
-                    .filter_by(id=record_dict['id'])
-                    .values(**update_data)
-                )
-                result = await session.execute(stmt)
-                updated_count += result.rowcount
+        logger.debug("Массовое обновление записей {}", cls.model.__name__)
+        records = [remove_none_values(record) for record in records]
+        records = [record for record in records if 'id' in record and len(record) > 1]
+        if not records:
+            return 0
 
-            await session.flush()
-            logger.info(f"Обновлено {updated_count} записей")
+        try:
+            # ORM bulk UPDATE по первичному ключу: один executemany
+            # на все записи вместо отдельного UPDATE на каждую. Он падает
+            # на отсутствующем id, а rowcount у executemany драйвер не
+            # отдаёт, поэтому существующие id выбираются одним запросом:
+            # отсутствующие, как и раньше, дают 0 обновлённых строк.
+            ids = {record['id'] for record in records}
+            existing = set(await session.scalars(select(cls.model.id).where(cls.model.id.in_(ids))))
+            records = [record for record in records if record['id'] in existing]
+            updated_count = len(existing)
+            if records:
+                await session.execute(sqlalchemy_update(cls.model), records)
+                await session.flush()
+            logger.debug("Обновлено {} записей", updated_count)
             return updated_count
         except SQLAlchemyError as e:
             await session.rollback()
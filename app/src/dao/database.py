@@ -1,12 +1,88 @@
+import time
 from contextlib import asynccontextmanager
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from config import settings
 
-DATABASE_URL = f"postgresql+asyncpg://{settings.db.POSTGRES_USER}:{settings.db.POSTGRES_PASSWORD}@{settings.db.POSTGRES_HOST}:{settings.db.POSTGRES_PORT}/{settings.db.POSTGRES_DB}" 
+DATABASE_URL = settings.db.DATABASE_URL or f"postgresql+asyncpg://{settings.db.POSTGRES_USER}:{settings.db.POSTGRES_PASSWORD}@{settings.db.POSTGRES_HOST}:{settings.db.POSTGRES_PORT}/{settings.db.POSTGRES_DB}" 
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+
+class PoolStats:
+    """Время ожидания соединения из пула и число таймаутов."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float, timed_out: bool = False) -> None:
+        self.checkouts += 1
+        self.timeouts += timed_out
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_stats.record(time.perf_counter() - start)
+        return connection
+
+
+def build_engine(url: str = DATABASE_URL):
+    db = settings.db
+    connect_args = {}
+    if url.startswith("postgresql+asyncpg"):
+        # Кеш подготовленных выражений asyncpg на соединение и таймауты
+        # на стороне клиента и сервера.
+        connect_args = {
+            "statement_cache_size": db.DB_STATEMENT_CACHE_SIZE,
+            "command_timeout": db.DB_COMMAND_TIMEOUT,
+            "server_settings": {"statement_timeout": str(db.DB_STATEMENT_TIMEOUT_MS)},
+        }
+    return create_async_engine(
+        url,
+        echo=db.DB_ECHO,
+        poolclass=InstrumentedPool,
+        pool_size=db.DB_POOL_SIZE,
+        max_overflow=db.DB_MAX_OVERFLOW,
+        pool_timeout=db.DB_POOL_TIMEOUT,
+        pool_recycle=db.DB_POOL_RECYCLE,
+        pool_pre_ping=db.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+
+def pool_status() -> dict:
+    """Текущее заполнение пула и статистика ожидания соединений."""
+    pool = engine.sync_engine.pool
+    capacity = settings.db.DB_POOL_SIZE + settings.db.DB_MAX_OVERFLOW
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "checked_out": checked_out,
+        "overflow": max(pool.overflow(), 0),
+        "saturation": checked_out / capacity if capacity else 0.0,
+        "checkouts": pool_stats.checkouts,
+        "timeouts": pool_stats.timeouts,
+        "wait_avg": pool_stats.wait_total / pool_stats.checkouts if pool_stats.checkouts else 0.0,
+        "wait_max": pool_stats.wait_max,
+    }
+
+
+engine = build_engine()
 
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -19,4 +95,4 @@ Base = declarative_base()
 @asynccontextmanager
 async def get_session():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
@@ -0,0 +1,137 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, cast
+from aiogram import Dispatcher
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.middleware import FSMContextMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import RedisStorage
+from config import settings
+
+
+class CachedRedisStorage(RedisStorage):
+    """RedisStorage с небольшим кешем в памяти процесса.
+
+    Состояние и данные читаются из Redis одним pipeline и кешируются
+    на cache_ttl секунд. Запись всегда сквозная: кеш может отставать от
+    изменений другой реплики, поэтому по нему запись не пропускается,
+    а обновляется он уже после записи. clear() пишет состояние и данные
+    одним pipeline, так что set_state и clear обходятся в один запрос
+    к Redis. cache_ttl ограничивает, насколько долго процесс может не
+    видеть изменение, сделанное другой репликой, поэтому он короткий.
+    """
+
+    def __init__(self, *args: Any, cache_ttl: float = 2.0, cache_size: int = 10_000, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._cache: OrderedDict[StorageKey, tuple[float, Optional[str], Dict[str, Any]]] = OrderedDict()
+
+    def _cached(self, key: StorageKey) -> Optional[tuple[Optional[str], Dict[str, Any]]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, state, data = entry
+        if expires_at <= time.monotonic():
+            del self._cache[key]
+            return None
+        return state, data
+
+    def _remember(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]) -> None:
+        self._cache[key] = (time.monotonic() + self.cache_ttl, state, data)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _load(self, key: StorageKey) -> tuple[Optional[str], Dict[str, Any]]:
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(self.key_builder.build(key, "state"))
+            pipe.get(self.key_builder.build(key, "data"))
+            raw_state, raw_data = await pipe.execute()
+
+        state = raw_state.decode("utf-8") if isinstance(raw_state, bytes) else raw_state
+        if isinstance(raw_data, bytes):
+            raw_data = raw_data.decode("utf-8")
+        data = cast(Dict[str, Any], self.json_loads(raw_data)) if raw_data is not None else {}
+        self._remember(key, state, data)
+        return state, data
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(key)
+        return state
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(key)
+        return dict(data)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = cast(Optional[str], state.state if isinstance(state, State) else state)
+        await super().set_state(key, value)
+        cached = self._cached(key)
+        if cached is not None:
+            self._remember(key, value, cached[1])
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await super().set_data(key, data)
+        cached = self._cached(key)
+        if cached is not None:
+            self._remember(key, cached[0], dict(data))
+
+    async def clear(self, key: StorageKey) -> None:
+        """Удаляет состояние и данные одним запросом."""
+        await self.redis.delete(self.key_builder.build(key, "state"), self.key_builder.build(key, "data"))
+        self._remember(key, None, {})
+
+
+class PipelinedFSMContext(FSMContext):
+    """FSMContext, у которого clear() — одна запись в хранилище,
+    если хранилище это умеет, а не set_state и set_data подряд."""
+
+    async def clear(self) -> None:
+        if isinstance(self.storage, CachedRedisStorage):
+            await self.storage.clear(self.key)
+        else:
+            await super().clear()
+
+
+class PipelinedFSMContextMiddleware(FSMContextMiddleware):
+    def resolve_context(self, *args: Any, **kwargs: Any) -> Optional[FSMContext]:
+        context = super().resolve_context(*args, **kwargs)
+        # У channel_post и подобных обновлений нет пользователя, и FSM нет.
+        if context is None:
+            return None
+        return PipelinedFSMContext(storage=context.storage, key=context.key)
+
+
+def create_dispatcher() -> Dispatcher:
+    """Dispatcher с хранилищем FSM из настроек.
+
+    Встроенная FSM-middleware заменяется на PipelinedFSMContextMiddleware
+    на том же месте цепочки, сразу после UserContextMiddleware.
+    """
+    storage = create_storage()
+    dp = Dispatcher(storage=storage, disable_fsm=True)
+    dp.fsm = PipelinedFSMContextMiddleware(
+        storage=storage,
+        strategy=dp.fsm.strategy,
+        events_isolation=dp.fsm.events_isolation,
+    )
+    dp.update.outer_middleware(dp.fsm)
+    return dp
+
+
+def create_storage() -> BaseStorage:
+    if settings.fsm.FSM_STORAGE == "memory":
+        return MemoryStorage()
+    return CachedRedisStorage.from_url(
+        url=settings.REDIS,
+        cache_ttl=settings.fsm.FSM_CACHE_TTL,
+        state_ttl=settings.fsm.FSM_STATE_TTL or None,
+        data_ttl=settings.fsm.FSM_STATE_TTL or None,
+    )
@@ -0,0 +1,2 @@
+from .queue import Job, QueueFull, QueueClosed, MemoryJobQueue, RedisJobQueue, job_queue
+from .worker import WorkerPool
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from config import settings
+from clients import clients
+
+
+class QueueFull(Exception):
+    """Очередь заданий заполнена, новое задание не принято."""
+
+
+class QueueClosed(QueueFull):
+    """Процесс останавливается и новых заданий не принимает."""
+
+
+@dataclass
+class Job:
+    chat_id: int
+    user_id: int
+    status_message_id: int
+    text: str
+    enqueued_at: float = field(default_factory=time.time)
+
+    def dumps(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def loads(cls, raw) -> "Job":
+        return cls(**json.loads(raw))
+
+
+class MemoryJobQueue:
+    """Очередь в памяти процесса: воркеры и обработчики в одном процессе."""
+
+    def __init__(self, max_size: Optional[int] = None):
+        self._queue: asyncio.Queue[Job] = asyncio.Queue(
+            maxsize=max_size or settings.jobs.JOB_QUEUE_MAX_SIZE
+        )
+        self.accepting = True
+
+    async def put(self, job: Job) -> int:
+        """Ставит задание в очередь и возвращает его позицию (с единицы)."""
+        if not self.accepting:
+            raise QueueClosed()
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull()
+        return self._queue.qsize()
+
+    async def get(self) -> Job:
+        return await self._queue.get()
+
+    async def size(self) -> int:
+        return self._queue.qsize()
+
+    def stop_accepting(self) -> None:
+        self.accepting = False
+
+    async def drain(self) -> list[Job]:
+        """Забирает задания, которые не успели начать: очередь
+        исчезнет вместе с процессом."""
+        jobs = []
+        while not self._queue.empty():
+            jobs.append(self._queue.get_nowait())
+        return jobs
+
+    async def requeue(self, job: Job) -> bool:
+        # Вернуть задание некому: другие процессы эту очередь не видят.
+        return False
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisJobQueue:
+    """Очередь в списке Redis, общая для всех реплик бота."""
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        max_size: Optional[int] = None,
+        key: str = "ttc:jobs",
+        poll_timeout: int = 5,
+    ):
+        self.redis = Redis.from_url(redis_url) if redis_url else clients.redis()
+        self.max_size = max_size or settings.jobs.JOB_QUEUE_MAX_SIZE
+        self.key = key
+        self.poll_timeout = poll_timeout
+
+    async def put(self, job: Job) -> int:
+        # Проверка длины и вставка не атомарны, поэтому при гонке очередь
+        # может ненадолго превысить max_size на число одновременных вставок.
+        if await self.redis.llen(self.key) >= self.max_size:
+            raise QueueFull()
+        return await self.redis.rpush(self.key, job.dumps())
+
+    async def get(self) -> Job:
+        while True:
+            item = await self.redis.blpop([self.key], timeout=self.poll_timeout)
+            if item is not None:
+                return Job.loads(item[1])
+
+    async def size(self) -> int:
+        return await self.redis.llen(self.key)
+
+    def stop_accepting(self) -> None:
+        # Очередь общая: задания, принятые сейчас, выполнят другие реплики.
+        pass
+
+    async def drain(self) -> list[Job]:
+        return []
+
+    async def requeue(self, job: Job) -> bool:
+        """Возвращает прерванное задание в начало общей очереди."""
+        try:
+            await self.redis.lpush(self.key, job.dumps())
+        except RedisError as e:
+            logger.error(f"Не удалось вернуть задание в очередь: {e}")
+            return False
+        return True
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+def create_job_queue():
+    if settings.jobs.JOB_BACKEND == "redis":
+        return RedisJobQueue()
+    return MemoryJobQueue()
+
+
+job_queue = create_job_queue()
@@ -0,0 +1,128 @@
+import asyncio
+import time
+from typing import Optional
+from aiogram import Bot
+from loguru import logger
+from config import settings
+from metrics import JOB_WAIT, JOB_LATENCY, JOBS_IN_FLIGHT
+from users.progress import ThrottledEditor, MESSAGE_LIMIT
+from agents.supervisor import get_supervisor
+from .queue import Job, QueueClosed
+
+# Пауза перед новой попыткой взять задание после ошибки очереди, с.
+GET_RETRY_DELAY = 1.0
+
+
+class WorkerPool:
+    """Фиксированное число воркеров, которые берут задания из очереди,
+    передают их Supervisor и отправляют результат в чат.
+
+    Число одновременных обращений к OpenAI ограничено числом воркеров,
+    а не числом пользователей, приславших задания.
+    """
+
+    def __init__(self, queue, bot: Bot, concurrency: Optional[int] = None):
+        self.queue = queue
+        self.bot = bot
+        self.concurrency = concurrency or settings.jobs.JOB_WORKERS
+        self._tasks: list[asyncio.Task] = []
+        self._current: dict[int, Job] = {}
+        self._interrupted: list[Job] = []
+        self._stopping = False
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._run(i)) for i in range(self.concurrency)
+        ]
+        logger.info(f"Запущено воркеров: {self.concurrency}")
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """Перестаёт брать задания и ждёт выполняющиеся до timeout секунд.
+
+        Прерванные и не начатые задания возвращаются в очередь, если её
+        видят другие реплики; иначе пользователю сообщается, что задание
+        нужно отправить ещё раз.
+        """
+        timeout = settings.jobs.JOB_DRAIN_TIMEOUT if timeout is None else timeout
+        self._stopping = True
+        self.queue.stop_accepting()
+
+        busy = [task for worker_id, task in enumerate(self._tasks) if worker_id in self._current]
+        for worker_id, task in enumerate(self._tasks):
+            if worker_id not in self._current:
+                task.cancel()
+        if busy:
+            logger.info(f"Ожидание выполняющихся заданий: {len(busy)}")
+            _, pending = await asyncio.wait(busy, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        leftover = self._interrupted + await self.queue.drain()
+        self._interrupted = []
+        for job in leftover:
+            if not await self.queue.requeue(job):
+                await self._report_interrupted(job)
+        if leftover:
+            logger.warning(f"При остановке не выполнено заданий: {len(leftover)}")
+
+    async def _run(self, worker_id: int) -> None:
+        while not self._stopping:
+            try:
+                job = await self.queue.get()
+            except QueueClosed:
+                break
+            except Exception as e:
+                # Сбой Redis или повреждённое задание не должны останавливать
+                # воркер: его никто не перезапустит.
+                logger.error(f"Воркер {worker_id}: не удалось получить задание: {e}")
+                await asyncio.sleep(GET_RETRY_DELAY)
+                continue
+            self._current[worker_id] = job
+            JOB_WAIT.observe(max(time.time() - job.enqueued_at, 0))
+            start = time.perf_counter()
+            status = "ok"
+            with JOBS_IN_FLIGHT.track_inprogress():
+                try:
+                    await self.process(job)
+                except asyncio.CancelledError:
+                    self._interrupted.append(job)
+                    raise
+                except Exception as e:
+                    status = "error"
+                    logger.error(f"Воркер {worker_id}: ошибка при обработке задания: {e}")
+                    await self._report_failure(job)
+                finally:
+                    self._current.pop(worker_id, None)
+            JOB_LATENCY.observe(time.perf_counter() - start, status=status)
+
+    async def process(self, job: Job) -> None:
+        editor = ThrottledEditor(self.bot, job.chat_id, job.status_message_id)
+        supervisor = get_supervisor()
+
+        async def offer_similar(answer: str) -> None:
+            prefix = "Похожее задание уже решалось, пока готовится ответ на ваше:\n\n"
+            await self.bot.send_message(job.chat_id, (prefix + answer)[:MESSAGE_LIMIT])
+
+        best_variant = await supervisor.process_task(
+            job.text,
+            on_progress=editor.update if settings.agents.STREAMING else None,
+            user_id=job.user_id,
+            on_similar=offer_similar,
+        )
+        await editor.finish(best_variant)
+
+    async def _report_failure(self, job: Job) -> None:
+        try:
+            await self.bot.send_message(job.chat_id, "Не удалось обработать задание, попробуйте позже")
+        except Exception as e:
+            logger.error(f"Не удалось сообщить об ошибке в чат {job.chat_id}: {e}")
+
+    async def _report_interrupted(self, job: Job) -> None:
+        try:
+            await self.bot.send_message(job.chat_id, "Бот перезапускается, отправьте задание ещё раз")
+        except Exception as e:
+            logger.error(f"Не удалось сообщить о прерванном задании в чат {job.chat_id}: {e}")
@@ -1,21 +1,137 @@
+import time
+
+# Отсчёт времени до готовности начинается до импорта остальных модулей.
+STARTED_AT = time.monotonic()
+
 from config import settings
-from aiogram import Bot, Dispatcher
+from clients import clients
 import logging
-from aiogram.fsm.storage.redis import RedisStorage
-from constants import router_list
+import multiprocessing
+import sys
+from aiohttp import web
+from loguru import logger as loguru_logger
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from constants import router_list, message_middleware_list
+from fsm_storage import create_dispatcher
+from users import known_users, registration_queue
+from tasks import task_log
+from dao import pool_status
+from agents.supervisor import get_supervisor
+from metrics import registry, readiness, add_probe_routes, HandlerMetricsMiddleware, start_metrics_server
+from middlewares import UpdateDeduplicationMiddleware
+from jobs import WorkerPool, job_queue
 from aiogram.exceptions import TelegramServerError, TelegramNetworkError, TelegramAPIError
 import asyncio
 
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=settings.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
-bot = Bot(token=settings.BOT_TOKEN)
-dp = Dispatcher()
-storage = RedisStorage.from_url(url=settings.REDIS)
+# Логи каждого вызова DAO пишутся на уровне DEBUG и форматируются loguru
+# только если этот уровень включён.
+loguru_logger.remove()
+loguru_logger.add(sys.stderr, level=settings.LOG_LEVEL)
 
+bot = clients.bot()
+dp = create_dispatcher()
+workers = WorkerPool(job_queue, bot)
+background_tasks: set[asyncio.Task] = set()
 
-async def main():
+
+def register_collectors():
+    pool_gauge = registry.gauge("ttc_db_pool", "Состояние пула соединений с базой.", ("stat",))
+    cache_gauge = registry.gauge("ttc_cache", "Статистика кешей.", ("cache", "stat"))
+    queue_gauge = registry.gauge("ttc_job_queue_depth", "Число заданий в очереди.")
+
+    async def collect():
+        queue_gauge.set(await job_queue.size())
+        for stat, value in pool_status().items():
+            pool_gauge.set(value, stat=stat)
+        for stat, value in known_users.stats().items():
+            cache_gauge.set(value, cache="known_users", stat=stat)
+        # До первого задания Supervisor нет, и создавать его ради метрик не нужно.
+        if not get_supervisor.cache_info().currsize:
+            return
+        supervisor = get_supervisor()
+        if supervisor.cache is not None:
+            for stat, value in supervisor.cache.stats().items():
+                cache_gauge.set(value, cache="result", stat=stat)
+
+    registry.add_collector(collect)
+
+
+def setup_dispatcher():
     dp.include_routers(*router_list)
+    dp.message.middleware(HandlerMetricsMiddleware())
+    for middleware in message_middleware_list:
+        dp.message.middleware(middleware)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
+
+def run_in_background(coro, name: str):
+    """Запускает прогрев, который не должен задерживать приём обновлений."""
+    task = asyncio.create_task(coro, name=name)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+async def warm_known_users():
+    # Пока кеш не заполнен, пользователи проверяются через Redis и базу.
+    try:
+        await known_users.warm()
+    except Exception as e:
+        logger.error(f"Could not warm known users cache: {e}")
+
+
+async def warm_llm_clients():
+    # Импорт openai занимает заметное время, поэтому он делается
+    # в потоке уже после готовности, а не на пути первого задания.
+    try:
+        await asyncio.to_thread(clients.openai)
+    except Exception as e:
+        logger.error(f"Could not prepare OpenAI client: {e}")
+
+
+async def prepare(worker_index: int = 0):
+    """Подготовка процесса перед приёмом обновлений."""
+    metrics = settings.metrics
+    if metrics.METRICS_ENABLED:
+        register_collectors()
+    if metrics.METRICS_ENABLED or metrics.PROBES_ENABLED:
+        # У каждого процесса свой порт метрик, иначе их нельзя различить.
+        await start_metrics_server(metrics.METRICS_PORT + worker_index)
+
+
+async def on_startup():
+    registration_queue.start()
+    task_log.start()
+    workers.start()
+    run_in_background(warm_known_users(), "warm-known-users")
+    run_in_background(warm_llm_clients(), "warm-llm-clients")
+
+    readiness.set()
+    startup_time = time.monotonic() - STARTED_AT
+    logger.info(f"Ready in {startup_time:.2f}s")
+    if startup_time > settings.metrics.STARTUP_BUDGET:
+        logger.warning(f"Startup took longer than {settings.metrics.STARTUP_BUDGET:.0f}s budget")
+
+
+async def on_shutdown():
+    readiness.clear()
+    for task in background_tasks:
+        task.cancel()
+    await workers.stop()
+    await registration_queue.stop()
+    await task_log.stop()
+    logger.info(f"Known users cache stats: {known_users.stats()}")
+    logger.info(f"Database pool stats: {pool_status()}")
+
+
+async def main():
+    setup_dispatcher()
+    await prepare()
+    await bot.delete_webhook()
+
     retry_attempts = 5
     for attempt in range(retry_attempts):
         try:
@@ -36,6 +152,76 @@ async def main():
             await asyncio.sleep(2 ** attempt)
     else:
         logger.error("Max retry attempts reached. Could not start bot.")
+    await clients.close()
+
+
+async def set_webhook():
+    webhook = settings.webhook
+    await bot.set_webhook(
+        f"{webhook.WEBHOOK_BASE_URL.rstrip('/')}{webhook.WEBHOOK_PATH}",
+        secret_token=webhook.WEBHOOK_SECRET or None,
+    )
+    # Сессия закрывается до fork, каждый процесс откроет свою.
+    await bot.session.close()
+    logger.info("Webhook set")
+
+
+def serve_webhook(worker_index: int = 0):
+    """Один процесс webhook-сервера. Процессы делят порт через
+    SO_REUSEPORT, а состояние FSM и дедупликацию update — через Redis."""
+    webhook = settings.webhook
+    setup_dispatcher()
+    dp.update.outer_middleware(UpdateDeduplicationMiddleware())
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=webhook.WEBHOOK_SECRET or None,
+    ).register(app, path=webhook.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    add_probe_routes(app)
+    app.on_startup.append(lambda _: prepare(worker_index))
+    app.on_cleanup.append(lambda _: clients.close())
+
+    logger.info(f"Start webhook worker {worker_index}")
+    web.run_app(
+        app,
+        host=webhook.WEBHOOK_HOST,
+        port=webhook.WEBHOOK_PORT,
+        reuse_port=webhook.WEB_WORKERS > 1,
+        print=None,
+        access_log=None,
+    )
+
+
+def run_webhook():
+    asyncio.run(set_webhook())
+
+    worker_count = settings.webhook.WEB_WORKERS
+    if worker_count <= 1:
+        serve_webhook()
+        return
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=serve_webhook, args=(i,), name=f"webhook-{i}")
+        for i in range(worker_count)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if settings.webhook.BOT_MODE == "webhook":
+        run_webhook()
+    else:
+        asyncio.run(main())
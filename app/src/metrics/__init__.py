@@ -0,0 +1,25 @@
+from .registry import registry, Counter, Gauge, Histogram
+from .instruments import (
+    DAO_LATENCY,
+    DAO_ERRORS,
+    DAO_IN_FLIGHT,
+    LLM_LATENCY,
+    LLM_TOKENS,
+    LLM_ERRORS,
+    LLM_IN_FLIGHT,
+    LLM_RETRIES,
+    LLM_HEDGES,
+    EVALUATIONS,
+    ADAPTIVE_DECISIONS,
+    ADAPTIVE_LEVEL,
+    RATE_LIMITED,
+    SINGLEFLIGHT,
+    JOB_WAIT,
+    JOB_LATENCY,
+    JOB_REJECTED,
+    JOBS_IN_FLIGHT,
+    track_llm_call,
+    observe_usage,
+)
+from .middleware import HandlerMetricsMiddleware
+from .server import start_metrics_server, add_probe_routes, readiness
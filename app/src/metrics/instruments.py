@@ -0,0 +1,103 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+from .registry import registry
+
+DAO_LATENCY = registry.histogram(
+    "ttc_dao_call_seconds", "Длительность вызовов методов BaseDAO.", ("model", "method")
+)
+DAO_ERRORS = registry.counter(
+    "ttc_dao_errors_total", "Ошибки в методах BaseDAO.", ("model", "method")
+)
+DAO_IN_FLIGHT = registry.gauge(
+    "ttc_dao_in_flight", "Выполняющиеся вызовы BaseDAO.", ("model",)
+)
+
+LLM_LATENCY = registry.histogram(
+    "ttc_llm_call_seconds", "Длительность запросов к OpenAI.", ("agent", "model")
+)
+LLM_TOKENS = registry.counter(
+    "ttc_llm_tokens_total", "Токены в запросах к OpenAI.", ("agent", "model", "kind")
+)
+LLM_ERRORS = registry.counter(
+    "ttc_llm_errors_total", "Ошибки запросов к OpenAI.", ("agent", "model")
+)
+LLM_IN_FLIGHT = registry.gauge(
+    "ttc_llm_in_flight", "Выполняющиеся запросы к OpenAI.", ("agent",)
+)
+LLM_RETRIES = registry.counter(
+    "ttc_llm_retries_total", "Повторные запросы к OpenAI после временных ошибок."
+)
+LLM_HEDGES = registry.counter(
+    "ttc_llm_hedges_total", "Дублирующие запросы к OpenAI для медленных ответов."
+)
+
+HANDLER_LATENCY = registry.histogram(
+    "ttc_handler_seconds", "Длительность обработчиков aiogram.", ("handler",)
+)
+HANDLER_ERRORS = registry.counter(
+    "ttc_handler_errors_total", "Ошибки обработчиков aiogram.", ("handler",)
+)
+HANDLER_IN_FLIGHT = registry.gauge(
+    "ttc_handler_in_flight", "Выполняющиеся обработчики aiogram.", ("handler",)
+)
+
+EVALUATIONS = registry.counter(
+    "ttc_evaluations_total",
+    "Выбор лучшего варианта по исходу: llm, tournament, unparsed, fallback или пропуск вызова оценщика.",
+    ("outcome",),
+)
+
+ADAPTIVE_DECISIONS = registry.counter(
+    "ttc_adaptive_decisions_total",
+    "Решения адаптивной политики по уровню качества и причине.",
+    ("level", "reason"),
+)
+ADAPTIVE_LEVEL = registry.gauge(
+    "ttc_adaptive_level", "Текущий уровень деградации: 0 — полное качество."
+)
+
+SINGLEFLIGHT = registry.counter(
+    "ttc_singleflight_total",
+    "Задания по источнику результата: leader — вычислено, local — ожидание "
+    "такого же задания в процессе, remote — на другой реплике.",
+    ("outcome",),
+)
+
+RATE_LIMITED = registry.counter(
+    "ttc_rate_limited_total", "Задания, отклонённые ограничением частоты.", ("scope",)
+)
+
+JOB_WAIT = registry.histogram(
+    "ttc_job_wait_seconds", "Время ожидания задания в очереди."
+)
+JOB_LATENCY = registry.histogram(
+    "ttc_job_seconds", "Время обработки задания воркером.", ("status",)
+)
+JOB_REJECTED = registry.counter(
+    "ttc_job_rejected_total", "Задания, отклонённые из-за переполнения очереди."
+)
+JOBS_IN_FLIGHT = registry.gauge(
+    "ttc_jobs_in_flight", "Задания, которые обрабатываются воркерами."
+)
+
+
+@contextmanager
+def track_llm_call(agent: str, model: str) -> Iterator[None]:
+    start = time.perf_counter()
+    LLM_IN_FLIGHT.inc(agent=agent)
+    try:
+        yield
+    except Exception:
+        LLM_ERRORS.inc(agent=agent, model=model)
+        raise
+    finally:
+        LLM_IN_FLIGHT.dec(agent=agent)
+        LLM_LATENCY.observe(time.perf_counter() - start, agent=agent, model=model)
+
+
+def observe_usage(agent: str, model: str, usage) -> None:
+    if usage is None:
+        return
+    LLM_TOKENS.inc(usage.prompt_tokens, agent=agent, model=model, kind="prompt")
+    LLM_TOKENS.inc(usage.completion_tokens, agent=agent, model=model, kind="completion")
@@ -0,0 +1,29 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from .instruments import HANDLER_LATENCY, HANDLER_ERRORS, HANDLER_IN_FLIGHT
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время, ошибки и число одновременно выполняющихся обработчиков."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+
+        start = time.perf_counter()
+        HANDLER_IN_FLIGHT.inc(handler=name)
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_IN_FLIGHT.dec(handler=name)
+            HANDLER_LATENCY.observe(time.perf_counter() - start, handler=name)
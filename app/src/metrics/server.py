@@ -0,0 +1,68 @@
+from typing import Optional
+from aiohttp import web
+from loguru import logger
+from config import settings
+from .registry import registry
+
+
+class Readiness:
+    """Готов ли процесс принимать обновления.
+
+    Процесс отвечает на /health, как только поднят HTTP-сервер, а на
+    /ready — только после on_startup и до начала остановки, так что
+    оркестратор не шлёт трафик в процесс, который ещё прогревается
+    или уже останавливается.
+    """
+
+    def __init__(self):
+        self.ready = False
+
+    def set(self) -> None:
+        self.ready = True
+
+    def clear(self) -> None:
+        self.ready = False
+
+
+readiness = Readiness()
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        text=await registry.render(),
+        content_type="text/plain",
+        charset="utf-8",
+        headers={"X-Content-Type-Options": "nosniff"},
+    )
+
+
+async def health_handler(request: web.Request) -> web.Response:
+    return web.Response(text="ok")
+
+
+async def ready_handler(request: web.Request) -> web.Response:
+    if readiness.ready:
+        return web.Response(text="ready")
+    return web.Response(status=503, text="starting")
+
+
+def add_probe_routes(app: web.Application) -> None:
+    app.router.add_get("/health", health_handler)
+    app.router.add_get("/ready", ready_handler)
+
+
+async def start_metrics_server(port: Optional[int] = None) -> web.AppRunner:
+    """Поднимает HTTP-эндпоинты /health, /ready и, если метрики
+    включены, /metrics в текущем цикле событий."""
+    port = port or settings.metrics.METRICS_PORT
+    app = web.Application()
+    add_probe_routes(app)
+    if settings.metrics.METRICS_ENABLED:
+        app.router.add_get("/metrics", metrics_handler)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.metrics.METRICS_HOST, port)
+    await site.start()
+    logger.info(f"HTTP-пробы доступны на {settings.metrics.METRICS_HOST}:{port}")
+    return runner
@@ -0,0 +1,2 @@
+from .dedup import UpdateDeduplicationMiddleware
+from .ratelimit import RateLimitMiddleware, RateLimiter
@@ -0,0 +1,39 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from clients import clients
+
+
+class UpdateDeduplicationMiddleware(BaseMiddleware):
+    """Пропускает update, уже принятый другим процессом или репликой.
+
+    Telegram повторяет доставку webhook, если не дождался ответа, а за
+    общим URL стоят несколько процессов; первый, кто записал update_id
+    в Redis (SET NX), обрабатывает его, остальные отбрасывают.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, ttl: int = 3600, namespace: str = "ttc:update"):
+        self.redis = Redis.from_url(redis_url) if redis_url else clients.redis()
+        self.ttl = ttl
+        self.namespace = namespace
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update):
+            try:
+                is_new = await self.redis.set(f"{self.namespace}:{event.update_id}", 1, nx=True, ex=self.ttl)
+            except RedisError as e:
+                # Без Redis лучше обработать возможный дубль, чем потерять update.
+                logger.warning(f"Не удалось проверить update {event.update_id} на повтор: {e}")
+                is_new = True
+            if not is_new:
+                logger.debug("Повторный update {} пропущен", event.update_id)
+                return None
+        return await handler(event, data)
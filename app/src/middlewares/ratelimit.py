@@ -0,0 +1,204 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message, TelegramObject
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from config import settings
+from clients import clients
+from metrics import RATE_LIMITED
+
+# Проверяет все бакеты из KEYS и списывает cost из каждого, только если
+# токенов хватает во всех; иначе возвращает, сколько секунд ждать, и номер
+# бакета, в который упёрся запрос.
+# ARGV: тройки (скорость в токенах/с, ёмкость, стоимость) на каждый ключ.
+# Время берётся у Redis, чтобы у всех реплик были одни часы.
+TOKEN_BUCKET_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local wait = 0
+local blocked = 0
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[3 * i - 2])
+    local capacity = tonumber(ARGV[3 * i - 1])
+    local cost = tonumber(ARGV[3 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    available = math.min(capacity, available + math.max(now - ts, 0) * rate)
+    if available < cost and (cost - available) / rate > wait then
+        wait = (cost - available) / rate
+        blocked = i
+    end
+    tokens[i] = available
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[3 * i - 2])
+    local capacity = tonumber(ARGV[3 * i - 1])
+    local cost = tonumber(ARGV[3 * i])
+    local left = tokens[i]
+    if wait == 0 then
+        left = left - cost
+    end
+    redis.call('HSET', key, 'tokens', left, 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return {tostring(wait), blocked}
+"""
+
+# Номер бакета в ответе скрипта -> имя для метрики.
+SCOPES = {1: "user", 2: "global"}
+
+# Сколько пользовательских бакетов держать в памяти при работе без Redis.
+LOCAL_BUCKETS_LIMIT = 100_000
+
+
+class TokenBucket:
+    """Бакет в памяти процесса; используется, пока Redis недоступен."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        return self.tokens
+
+    def wait_time(self, cost: float) -> float:
+        available = self.refill()
+        return 0.0 if available >= cost else (cost - available) / self.rate
+
+
+class RateLimiter:
+    """Бакеты на пользователя и общий на все реплики.
+
+    Пользовательский бакет считает задания, общий — запросы к OpenAI,
+    которые задание может сделать, поэтому его ёмкость задаётся квотой
+    провайдера. Без Redis те же бакеты ведутся в памяти процесса, а общая
+    скорость делится между процессами webhook-сервера.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, namespace: str = "ttc:ratelimit"):
+        self.redis = Redis.from_url(redis_url) if redis_url else clients.redis()
+        self.script = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+        self.namespace = namespace
+        config = settings.ratelimit
+        self.user_rate = config.RATE_LIMIT_USER_PER_MINUTE / 60
+        self.user_burst = config.RATE_LIMIT_USER_BURST
+        self.global_rate = config.RATE_LIMIT_GLOBAL_CALLS_PER_MINUTE / 60
+        self.global_burst = config.RATE_LIMIT_GLOBAL_BURST
+        self._local_users: OrderedDict[int, TokenBucket] = OrderedDict()
+        processes = max(settings.webhook.WEB_WORKERS, 1)
+        self._local_global = TokenBucket(self.global_rate / processes, self.global_burst / processes)
+        self._cost_warned = False
+
+    def cost(self, calls: int) -> int:
+        """Стоимость задания в общем бакете. Если задание дороже ёмкости
+        бакета, оно не прошло бы никогда, поэтому списывается вся ёмкость:
+        такие задания идут не чаще, чем бакет наполняется целиком."""
+        if calls > self.global_burst:
+            if not self._cost_warned:
+                self._cost_warned = True
+                logger.warning(
+                    f"Задание делает {calls} запросов к OpenAI, больше RATE_LIMIT_GLOBAL_BURST="
+                    f"{self.global_burst}; списывается вся ёмкость общего бакета"
+                )
+            return self.global_burst
+        return calls
+
+    async def acquire(self, user_id: int, calls: int) -> tuple[float, str]:
+        """Секунды до следующей попытки (0 — можно выполнять) и бакет,
+        в который упёрся запрос."""
+        calls = self.cost(calls)
+        try:
+            wait, blocked = await self.script(
+                keys=[f"{self.namespace}:user:{user_id}", f"{self.namespace}:global"],
+                args=[self.user_rate, self.user_burst, 1, self.global_rate, self.global_burst, calls],
+            )
+        except RedisError as e:
+            logger.warning(f"Ограничение частоты в Redis недоступно, используются локальные бакеты: {e}")
+            return self._acquire_local(user_id, calls)
+        return float(wait), SCOPES.get(blocked, "")
+
+    async def refund(self, user_id: int, calls: int) -> None:
+        """Возвращает токены задания, которое так и не выполнилось."""
+        calls = self.cost(calls)
+        try:
+            # Отрицательная стоимость всегда проходит и добавляет токены;
+            # лишнее сверх ёмкости срежется при следующем обращении.
+            await self.script(
+                keys=[f"{self.namespace}:user:{user_id}", f"{self.namespace}:global"],
+                args=[self.user_rate, self.user_burst, -1, self.global_rate, self.global_burst, -calls],
+            )
+        except RedisError as e:
+            logger.warning(f"Не удалось вернуть токены в Redis: {e}")
+            bucket = self._local_users.get(user_id)
+            if bucket is not None:
+                bucket.tokens = min(bucket.capacity, bucket.tokens + 1)
+            self._local_global.tokens = min(self._local_global.capacity, self._local_global.tokens + calls)
+
+    def _acquire_local(self, user_id: int, calls: int) -> tuple[float, str]:
+        # Локальный общий бакет — доля общего, и задание может быть дороже его.
+        calls = min(calls, self._local_global.capacity)
+        bucket = self._local_users.get(user_id)
+        if bucket is None:
+            bucket = self._local_users[user_id] = TokenBucket(self.user_rate, self.user_burst)
+            while len(self._local_users) > LOCAL_BUCKETS_LIMIT:
+                self._local_users.popitem(last=False)
+        self._local_users.move_to_end(user_id)
+
+        user_wait = bucket.wait_time(1)
+        global_wait = self._local_global.wait_time(calls)
+        if user_wait or global_wait:
+            return max(user_wait, global_wait), "user" if user_wait >= global_wait else "global"
+        bucket.tokens -= 1
+        self._local_global.tokens -= calls
+        return 0.0, ""
+
+
+class RateLimitMiddleware(BaseMiddleware):
+    """Ограничивает частоту обработчиков с флагом rate_limit.
+
+    Значение флага — число запросов к OpenAI на одно задание; по нему
+    списываются токены общего бакета. Обработчик получает refund_rate_limit,
+    чтобы вернуть токены, если задание не было принято.
+    """
+
+    def __init__(self, limiter: Optional[RateLimiter] = None):
+        self.limiter = limiter or RateLimiter()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        calls = get_flag(data, "rate_limit")
+        if not settings.ratelimit.RATE_LIMIT_ENABLED or not calls or not isinstance(event, Message):
+            return await handler(event, data)
+
+        if callable(calls):
+            calls = calls()
+        user_id = event.from_user.id
+        wait, scope = await self.limiter.acquire(user_id, calls)
+        if wait:
+            RATE_LIMITED.inc(scope=scope)
+            logger.debug("Пользователь {} упёрся в лимит {}, ждать {:.1f} с", event.from_user.id, scope, wait)
+            await event.answer(
+                f"Слишком много запросов, попробуйте отправить задание через {max(round(wait), 1)} с"
+            )
+            return None
+
+        async def refund() -> None:
+            await self.limiter.refund(user_id, calls)
+
+        data["refund_rate_limit"] = refund
+        return await handler(event, data)
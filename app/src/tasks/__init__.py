@@ -0,0 +1,3 @@
+from .models import TaskLog
+from .service import task_log_service
+from .writer import task_log
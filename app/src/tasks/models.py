@@ -0,0 +1,25 @@
+from typing import Optional
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import String, BigInteger, Integer, Text, JSON, Index
+from dao import BaseModel
+
+class TaskLog(BaseModel):
+    __tablename__ = 'task_log'
+    __table_args__ = (
+        Index('ix_task_log_created_at', 'created_at'),
+        Index('ix_task_log_telegram_id', 'telegram_id'),
+    )
+
+    telegram_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    topic: Mapped[str] = mapped_column(Text, nullable=False)
+    variants: Mapped[list] = mapped_column(JSON, nullable=False)
+    winner: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    answer: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    source: Mapped[str] = mapped_column(String(16), nullable=False)
+    status: Mapped[str] = mapped_column(String(16), nullable=False)
+    model: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    level: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    latency_ms: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<TaskLog(id={self.id}, telegram_id={self.telegram_id}, source={self.source}, status={self.status}, latency_ms={self.latency_ms})>"
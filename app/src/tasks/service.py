@@ -0,0 +1,7 @@
+from dao import BaseDAO
+from .models import TaskLog
+
+class TaskLogService(BaseDAO[TaskLog]):
+    model = TaskLog
+
+task_log_service = TaskLogService()
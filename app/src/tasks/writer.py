@@ -0,0 +1,152 @@
+import asyncio
+import datetime
+from typing import Optional
+from asyncpg import InterfaceError as DriverInterfaceError, PostgresConnectionError
+from loguru import logger
+from sqlalchemy.exc import DBAPIError, DisconnectionError, InterfaceError, OperationalError
+from config import settings
+from dao import get_session
+from .service import task_log_service
+
+# Сколько записей держать в буфере, пока база недоступна.
+MAX_PENDING = 50_000
+
+# Ошибки, при которых виновата не запись, а соединение с базой. COPY
+# идёт напрямую через asyncpg, и его ошибки SQLAlchemy не оборачивает.
+CONNECTION_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    DisconnectionError,
+    InterfaceError,
+    OperationalError,
+    PostgresConnectionError,
+    DriverInterfaceError,
+)
+
+
+def is_connection_error(error: Exception) -> bool:
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(error, CONNECTION_ERRORS)
+
+
+def normalize_record(record: dict) -> dict:
+    """Приводит запись к столбцам task_log: COPY требует одинакового
+    набора ключей, а NULL в обязательном столбце отклонил бы всю пачку."""
+    level = record.get("level")
+    return {
+        "telegram_id": record.get("telegram_id"),
+        "topic": str(record.get("topic") or ""),
+        "variants": [str(variant) for variant in record.get("variants") or []],
+        "winner": record.get("winner"),
+        "answer": record.get("answer"),
+        "source": str(record.get("source") or "unknown")[:16],
+        "status": str(record.get("status") or "unknown")[:16],
+        "model": record.get("model"),
+        "level": str(level)[:16] if level is not None else None,
+        "latency_ms": int(record.get("latency_ms") or 0),
+        "created_at": record.get("created_at") or datetime.datetime.now(datetime.timezone.utc),
+    }
+
+
+class TaskLogWriter:
+    """Фоновая запись журнала заданий.
+
+    put() только добавляет запись в буфер; фоновая задача загружает его
+    в базу одним COPY раз в flush_interval секунд или сразу по достижении
+    batch_size записей, так что обработка задания базу не ждёт.
+
+    Если база отклонила пачку не из-за соединения, пачка делится пополам,
+    пока не найдутся отклонённые записи: они отбрасываются, остальные
+    записываются. Пачка, которую не удалось записать, повторяется не
+    больше max_retries раз.
+    """
+
+    def __init__(
+        self,
+        flush_interval: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        max_retries: Optional[int] = None,
+    ):
+        self.flush_interval = flush_interval or settings.db.TASK_LOG_FLUSH_INTERVAL
+        self.batch_size = batch_size or settings.db.TASK_LOG_BATCH_SIZE
+        self.max_retries = settings.db.TASK_LOG_MAX_RETRIES if max_retries is None else max_retries
+        # Записи и число неудачных попыток их записать.
+        self._pending: list[tuple[dict, int]] = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу и сбрасывает остаток буфера."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def put(self, record: dict) -> None:
+        if not settings.db.TASK_LOG_ENABLED:
+            return
+        if len(self._pending) >= MAX_PENDING:
+            logger.warning("Буфер журнала заданий переполнен, запись отброшена")
+            return
+        self._pending.append((normalize_record(record), 0))
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+
+            copied, failed = await self._write(batch)
+            retry = [(record, attempts + 1) for record, attempts in failed if attempts < self.max_retries]
+            if len(retry) < len(failed):
+                logger.error(f"Журнал заданий: отброшено записей после {self.max_retries} попыток: {len(failed) - len(retry)}")
+            # Новые записи важнее старых: при переполнении отбрасываются старые.
+            self._pending = (retry + self._pending)[-MAX_PENDING:]
+
+            if copied:
+                logger.debug("Записано в журнал заданий: {}", copied)
+            return copied
+
+    async def _write(self, batch: list[tuple[dict, int]]) -> tuple[int, list[tuple[dict, int]]]:
+        """Записывает пачку; возвращает число записанных записей и те,
+        что стоит повторить позже."""
+        try:
+            async with get_session() as session:
+                copied = await task_log_service.copy_many([record for record, _ in batch], session=session)
+                await session.commit()
+            return copied, []
+        except Exception as e:
+            if is_connection_error(e):
+                logger.error(f"База недоступна, запись журнала заданий ({len(batch)} записей) будет повторена: {e}")
+                return 0, batch
+            if len(batch) == 1:
+                logger.error(f"Запись журнала заданий отклонена базой и отброшена: {e}")
+                return 0, []
+            middle = len(batch) // 2
+            left_copied, left_failed = await self._write(batch[:middle])
+            right_copied, right_failed = await self._write(batch[middle:])
+            return left_copied + right_copied, left_failed + right_failed
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+task_log = TaskLogWriter()
@@ -1,4 +1,6 @@
 from .models import User
 from .service import user_service
 from .validator import UserFilter
-from .states import UserRequest
\ No newline at end of file
+from .states import UserRequest
+from .cache import known_users
+from .registration import registration_queue
\ No newline at end of file
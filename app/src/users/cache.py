@@ -0,0 +1,78 @@
+from typing import Iterable, Optional
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from clients import clients
+from .service import user_service
+
+
+class KnownUsers:
+    """Кеш уже зарегистрированных telegram_id.
+
+    Локальное множество отвечает без сетевых запросов, Redis делит
+    зарегистрированных пользователей между репликами; в базу идёт
+    только запрос о пользователе, которого нет ни там, ни там.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, key: str = "ttc:known_users"):
+        self.redis = Redis.from_url(redis_url) if redis_url else clients.redis()
+        self.key = key
+        self._local: set[int] = set()
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    async def warm(self, chunk_size: int = 5000) -> int:
+        """Заполняет кеш всеми пользователями из базы при старте."""
+        telegram_ids = await user_service.get_telegram_ids()
+        self._local.update(telegram_ids)
+        try:
+            for i in range(0, len(telegram_ids), chunk_size):
+                await self.redis.sadd(self.key, *telegram_ids[i:i + chunk_size])
+        except RedisError as e:
+            logger.warning(f"Не удалось прогреть кеш пользователей в Redis: {e}")
+        logger.info(f"Кеш пользователей прогрет: {len(self._local)} записей")
+        return len(self._local)
+
+    async def contains(self, telegram_id: int) -> bool:
+        if telegram_id in self._local:
+            self.local_hits += 1
+            return True
+
+        try:
+            known = await self.redis.sismember(self.key, telegram_id)
+        except RedisError as e:
+            logger.warning(f"Кеш пользователей недоступен в Redis: {e}")
+            known = False
+
+        if known:
+            self._local.add(telegram_id)
+            self.redis_hits += 1
+            return True
+
+        self.misses += 1
+        return False
+
+    async def add(self, *telegram_ids: int) -> None:
+        self.add_local(telegram_ids)
+        try:
+            await self.redis.sadd(self.key, *telegram_ids)
+        except RedisError as e:
+            logger.warning(f"Не удалось сохранить пользователей в Redis: {e}")
+
+    def add_local(self, telegram_ids: Iterable[int]) -> None:
+        self._local.update(telegram_ids)
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.local_hits + self.redis_hits) / lookups if lookups else 0.0,
+            "size": len(self._local),
+        }
+
+
+known_users = KnownUsers()
@@ -0,0 +1,82 @@
+import asyncio
+import time
+from typing import Optional
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from config import settings
+
+# Ограничение Telegram на длину одного сообщения.
+MESSAGE_LIMIT = 4096
+
+
+class ThrottledEditor:
+    """Показывает частичный ответ, редактируя одно сообщение.
+
+    Обновления склеиваются: сообщение редактируется не чаще, чем раз
+    в interval секунд, и всегда последним накопленным текстом.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        chat_id: int,
+        message_id: int,
+        text: Optional[str] = None,
+        interval: Optional[float] = None,
+    ):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.interval = settings.agents.STREAM_EDIT_INTERVAL if interval is None else interval
+        self._pending: Optional[str] = None
+        self._shown: Optional[str] = text
+        self._last_edit = 0.0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def update(self, text: str) -> None:
+        self._pending = text[:MESSAGE_LIMIT]
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+
+        # Редактирование идёт в фоне, чтобы не задерживать чтение потока.
+        delay = max(self._last_edit + self.interval - time.monotonic(), 0)
+        self._flush_task = asyncio.create_task(self._flush_later(delay))
+
+    async def finish(self, text: str) -> None:
+        """Заменяет частичный ответ итоговым; остаток длинного текста
+        досылается отдельными сообщениями."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        self._pending = None
+
+        chunks = [text[i:i + MESSAGE_LIMIT] for i in range(0, len(text), MESSAGE_LIMIT)] or [text]
+        async with self._lock:
+            await self._edit(chunks[0])
+        for chunk in chunks[1:]:
+            await self.bot.send_message(self.chat_id, chunk)
+
+    async def _flush_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await self._flush()
+
+    async def _flush(self) -> None:
+        async with self._lock:
+            text, self._pending = self._pending, None
+            if text:
+                await self._edit(text)
+
+    async def _edit(self, text: str) -> None:
+        if text == self._shown:
+            return
+        try:
+            await self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message_id)
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+            await self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message_id)
+        except TelegramBadRequest:
+            # "message is not modified" и подобные ошибки не мешают ответу.
+            return
+        finally:
+            self._last_edit = time.monotonic()
+        self._shown = text
@@ -0,0 +1,102 @@
+import asyncio
+from typing import Optional
+from loguru import logger
+from config import settings
+from dao import get_session
+from .service import user_service
+from .cache import known_users
+
+# Сколько записей держать в очереди, пока база недоступна.
+MAX_PENDING = 100_000
+
+
+class RegistrationQueue:
+    """Отложенная пакетная регистрация пользователей.
+
+    Обработчик только кладёт запись в очередь; фоновая задача сбрасывает
+    её в базу через INSERT ... ON CONFLICT (telegram_id) DO NOTHING пачками
+    по batch_size записей раз в flush_interval секунд или сразу по
+    достижении batch_size записей.
+    """
+
+    def __init__(self, flush_interval: Optional[float] = None, batch_size: Optional[int] = None):
+        self.flush_interval = flush_interval or settings.db.REGISTRATION_FLUSH_INTERVAL
+        self.batch_size = batch_size or settings.db.REGISTRATION_BATCH_SIZE
+        self._pending: dict[int, dict] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу и сбрасывает остаток очереди."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def put(self, telegram_id: int, username: Optional[str], full_name: Optional[str]) -> None:
+        self._pending[telegram_id] = {
+            "telegram_id": telegram_id,
+            "username": username,
+            "full_name": full_name,
+        }
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            records = list(self._pending.values())
+            self._pending.clear()
+
+            # После простоя базы очередь может вырасти до MAX_PENDING, а
+            # в одном запросе asyncpg допускает не больше 32767 параметров,
+            # поэтому записи вставляются пачками по batch_size.
+            inserted = written = 0
+            try:
+                async with get_session() as session:
+                    for start in range(0, len(records), self.batch_size):
+                        chunk = records[start:start + self.batch_size]
+                        inserted += await user_service.add_many_ignore_conflicts(
+                            chunk, ["telegram_id"], session=session
+                        )
+                        await session.commit()
+                        written += len(chunk)
+            except Exception as e:
+                logger.error(f"Не удалось зарегистрировать {len(records) - written} пользователей: {e}")
+                self._requeue(records[written:])
+
+            # В общий кеш Redis пользователь попадает только после записи
+            # в базу, чтобы падение процесса не оставило его незарегистрированным.
+            if written:
+                await known_users.add(*(record["telegram_id"] for record in records[:written]))
+                logger.info(f"Зарегистрировано новых пользователей: {inserted} из {written}")
+            return inserted
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def _requeue(self, records: list[dict]) -> None:
+        for record in records:
+            if len(self._pending) >= MAX_PENDING:
+                logger.warning("Очередь регистрации переполнена, часть записей отброшена")
+                break
+            self._pending.setdefault(record["telegram_id"], record)
+
+
+registration_queue = RegistrationQueue()
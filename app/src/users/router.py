@@ -1,17 +1,18 @@
 from aiogram import (
     F,
     types,
-    Bot,
     Router
 )
 from aiogram.fsm.context import FSMContext
 from config import settings
 from aiogram.filters import Command, CommandObject
 from aiogram.types.message import ContentType
+from loguru import logger
+from redis.exceptions import RedisError
 from users import UserRequest, UserFilter
-from agents.supervisor import super_visor
-
-bot = Bot(token=settings.BOT_TOKEN)
+from jobs import Job, QueueFull, QueueClosed, job_queue
+from metrics import JOB_REJECTED
+from agents.supervisor import llm_calls_per_task
 
 router = Router()
 
@@ -23,15 +24,52 @@ async def start(message: types.Message, command: CommandObject, state: FSMContex
     await state.set_state(UserRequest.request)
 
 
-@router.message(UserRequest.request, UserFilter())
-async def request(message: types.Message, state: FSMContext):
+@router.message(UserRequest.request, F.text, UserFilter(), flags={"rate_limit": llm_calls_per_task})
+async def request(message: types.Message, state: FSMContext, refund_rate_limit=None):
     userMessage = message.text
-    
-    await message.answer("Задание принято на обработку")
 
-    best_variant = await super_visor.process_task(userMessage)
-    
-    await message.answer(best_variant)
+    # Место в очереди показывается до постановки задания: иначе быстрый
+    # воркер может ответить раньше и его ответ затрётся этим текстом.
+    queued = 0
+    if settings.jobs.JOB_NOTIFY_POSITION:
+        try:
+            queued = await job_queue.size()
+        except RedisError as e:
+            logger.warning(f"Не удалось узнать длину очереди заданий: {e}")
+    if queued:
+        status = await message.answer(f"Задание принято, место в очереди: {queued + 1}")
+    else:
+        status = await message.answer("Задание принято на обработку")
+
+    job = Job(
+        chat_id=message.chat.id,
+        user_id=message.from_user.id,
+        status_message_id=status.message_id,
+        text=userMessage,
+    )
+    try:
+        await job_queue.put(job)
+    except RedisError as e:
+        logger.error(f"Не удалось поставить задание в очередь: {e}")
+        if refund_rate_limit is not None:
+            await refund_rate_limit()
+        await status.edit_text("Не удалось принять задание, попробуйте отправить его позже")
+        return
+    except QueueFull as e:
+        # Задание не принято: токены ограничения частоты возвращаются.
+        if refund_rate_limit is not None:
+            await refund_rate_limit()
+        if isinstance(e, QueueClosed):
+            await status.edit_text("Бот перезапускается, отправьте задание через минуту")
+            return
+        JOB_REJECTED.inc()
+        await status.edit_text("Сейчас слишком много заданий, попробуйте отправить его позже")
+        return
 
     await state.clear()
-    
\ No newline at end of file
+    
+
+
+@router.message(UserRequest.request, UserFilter())
+async def request_not_text(message: types.Message):
+    await message.answer("Задание принимается только текстом, отправьте его сообщением")
@@ -1,7 +1,30 @@
-from dao import BaseDAO
+from typing import List, Optional
+from loguru import logger
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from dao import BaseDAO, get_session
+from dao.dao import observed
 from .models import User
 
 class UserService(BaseDAO[User]):
     model = User
 
-user_service = UserService()
\ No newline at end of file
+    @classmethod
+    @observed
+    async def get_telegram_ids(cls, session: Optional[AsyncSession] = None) -> List[int]:
+        if session is None:
+            async with get_session() as session:
+                return await cls.get_telegram_ids(session=session)
+
+        logger.debug("Загрузка telegram_id всех пользователей")
+        try:
+            result = await session.execute(select(cls.model.telegram_id))
+            telegram_ids = result.scalars().all()
+            logger.debug("Загружено {} telegram_id.", len(telegram_ids))
+            return telegram_ids
+        except SQLAlchemyError as e:
+            logger.error(f"Ошибка при загрузке telegram_id: {e}")
+            raise
+
+user_service = UserService()
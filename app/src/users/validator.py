@@ -1,7 +1,8 @@
 from aiogram.filters import BaseFilter
 from aiogram.types import Message
 from .models import User
-from .service import user_service
+from .cache import known_users
+from .registration import registration_queue
 
 class UserFilter(BaseFilter):
     async def __call__(self, message: Message) -> bool:
@@ -9,16 +10,12 @@ class UserFilter(BaseFilter):
         username = message.from_user.username
         full_name = message.from_user.full_name
 
-        user_filter = {"telegram_id": telegram_id}
+        if await known_users.contains(telegram_id):
+            return True
 
-        user_record = await user_service.find_one_or_none(user_filter)
+        # Регистрация идёт пакетами в фоне, поэтому обработчик не ждёт
+        # базу; повторная вставка отсекается ON CONFLICT (telegram_id).
+        registration_queue.put(telegram_id, username, full_name)
+        known_users.add_local([telegram_id])
 
-        if user_record is None:
-            new_user_data = {
-                "telegram_id": telegram_id,
-                "username": username,
-                "full_name": full_name
-            }
-            await user_service.add(new_user_data)
-            
         return True